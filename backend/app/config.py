@@ -12,6 +12,54 @@ class Settings(BaseSettings):
     longcat_api_key: Optional[str] = None
     github_token: Optional[str] = None
     
+    # RAG
+    rag_embedding_dtype: str = "float32"  # float32 or float16 for vector_store/embeddings.bin
+    rag_embedding_cache_size: int = 50000  # Max cached chunk embeddings (0 disables the cache)
+    rag_embedding_backend: str = "torch"  # torch, or onnx (needs sentence-transformers[onnx])
+    rag_onnx_quantization: str = ""  # int8 preset for the ONNX model: arm64, avx2, avx512, avx512_vnni
+    rag_embedding_threads: int = 0  # Intra-op threads for the embedding model (0 = library default)
+    rag_index_backend: str = "hnsw"  # ANN backend used after promotion: flat, hnsw or ivfpq
+    rag_ann_promotion_threshold: int = 50000  # Chunk count at which the flat index is promoted
+    rag_hnsw_m: int = 32
+    rag_hnsw_ef_construction: int = 80
+    rag_hnsw_ef_search: int = 64
+    rag_ivf_nlist: int = 0  # 0 picks ~4*sqrt(n) lists automatically
+    rag_ivf_nprobe: int = 16
+    rag_pq_m: int = 48  # PQ sub-quantizers, must divide the embedding dimension
+    rag_vector_codec: str = "float32"  # Shard vector storage: float32, fp16, sq8 (int8) or pq
+    rag_rerank_multiplier: int = 4  # Quantized searches re-rank this many times k candidates exactly
+    rag_tombstone_rebuild_ratio: float = 0.2  # Rebuild HNSW once this share of vectors is deleted
+    rag_executor_workers: int = 2  # Threads for embedding and index work off the event loop
+    rag_query_batch_size: int = 16  # Max chat queries encoded together
+    rag_query_batch_wait_ms: float = 5.0  # How long a query waits for others to join its batch
+    rag_history_index_delay_ms: int = 500  # Batching delay before saved chats are embedded
+    rag_ingest_batch_chunks: int = 128  # Chunks embedded and indexed at a time while a document streams in
+    rag_chunking_strategy: str = "fixed"  # fixed (800/100 chars) or structured (headings/paragraphs/sentences in model tokens, opt-in)
+    rag_chunk_max_tokens: int = 0  # Token budget of a structured chunk (0 = the model's max sequence length)
+    rag_chunk_overlap_tokens: int = 32  # Trailing tokens repeated at the start of the next structured chunk
+    rag_checkpoint_interval_seconds: float = 5.0  # Delay before unsaved index changes are written out
+    rag_checkpoint_max_pending: int = 50  # Write a checkpoint right away after this many changes
+    rag_search_mode: str = "hybrid"  # dense, lexical (BM25) or hybrid (rank fusion of both)
+    rag_hybrid_candidates: int = 20  # Candidates taken from each retriever before fusion
+    rag_rrf_k: int = 60  # Reciprocal-rank fusion damping constant
+    rag_mmr_lambda: float = 0.7  # MMR relevance/diversity trade-off (1.0 ranks by relevance only)
+    rag_mmr_candidate_multiplier: int = 4  # Candidates re-ranked per requested result
+    rag_duplicate_threshold: float = 0.95  # Cosine above which a candidate counts as a near-duplicate
+    rag_filter_exact_search_max: int = 4096  # Filtered searches over at most this many chunks scan exactly
+    rag_shard_search_workers: int = 4  # Threads a query fans out to across folder shards
+    rag_worker_role: str = "single"  # single, auto (first worker to lock the store writes), writer or reader
+    rag_snapshot_poll_seconds: float = 1.0  # How often readers look for snapshots and the writer for queued jobs
+    rag_snapshot_retention_seconds: float = 60.0  # Superseded snapshots are deleted after this long
+    rag_watch_mode: str = "auto"  # Keep data/ in sync: auto, events (watchfiles), poll or off
+    rag_watch_debounce_ms: int = 1000  # A batch of file changes is synced once data/ is quiet this long
+    rag_watch_poll_seconds: float = 2.0  # Scan interval when polling instead of using file events
+    
+    # File processing
+    extraction_workers: int = 0  # Processes parsing PDF/DOCX files (0 = one per CPU core)
+    extraction_max_pending: int = 0  # Parse jobs queued or running at once (0 = twice the workers)
+    extraction_pdf_pages_per_task: int = 16  # PDF pages parsed per job, long PDFs are split across workers
+    extraction_cache_max_mb: int = 256  # Compressed extracted text kept in cache/ (0 disables the cache)
+    
     # Server
     port: int = 8003
     host: str = "0.0.0.0"
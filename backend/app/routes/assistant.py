@@ -4,7 +4,7 @@ import json
 from datetime import datetime
 
 from app.models.database import get_database
-from app.services.rag_service import get_rag_system
+from app.services.rag_service import SEARCH_MODES, SOURCE_KINDS, get_ready_rag_system, get_rag_status
 from app.services.gemini_service import gemini_service
 from app.services.longcat_service import longcat_service
 from app.services.github_models_service import github_models_service
@@ -51,12 +51,28 @@ async def chat_with_assistant(
     context_notes: Optional[str] = Form(None),
     note_ids: Optional[str] = Form(None),
     use_rag: bool = Form(True),
-    isolate_message: bool = Form(False)
+    isolate_message: bool = Form(False),
+    search_mode: Optional[str] = Form(None),
+    folder_id: Optional[str] = Form(None),
+    source_kind: Optional[str] = Form(None)
 ):
     """Chat with AI assistant Isabella with RAG integration."""
     import time
     start_time = time.time()
     
+    if search_mode and search_mode not in SEARCH_MODES:
+        logger.error(f"Invalid RAG search mode: {search_mode}")
+        raise HTTPException(
+            status_code=400,
+            detail=f"search_mode must be one of: {', '.join(SEARCH_MODES)}"
+        )
+    if source_kind and source_kind not in SOURCE_KINDS:
+        logger.error(f"Invalid RAG source kind: {source_kind}")
+        raise HTTPException(
+            status_code=400,
+            detail=f"source_kind must be one of: {', '.join(SOURCE_KINDS)}"
+        )
+    
     logger.info(f"=== Chat Request Started ===")
     logger.info(f"Model: {model}")
     logger.info(f"RAG Enabled: {use_rag}")
@@ -84,10 +100,16 @@ async def chat_with_assistant(
         rag_context = ""
         sources = []
         
-        if use_rag:
-            logger.info("Searching RAG database for relevant context...")
-            rag = await get_rag_system()
-            results = rag.search(message, k=3)
+        rag = get_ready_rag_system() if use_rag else None
+        if use_rag and rag is None:
+            logger.warning("RAG index is still building, answering without document context")
+        
+        if rag is not None:
+            rag_filters = {'folder_id': folder_id, 'source_kind': source_kind}
+            logger.info(f"Searching RAG database for relevant context (mode: {search_mode or 'default'})...")
+            if folder_id or source_kind:
+                logger.info(f"RAG scope: folder={folder_id or 'any'}, source={source_kind or 'any'}")
+            results = await rag.search_async(message, k=3, mode=search_mode, filters=rag_filters)
             
             if results:
                 rag_context = "\n\nRelevant context from your documents:\n"
@@ -102,7 +124,10 @@ async def chat_with_assistant(
                     })
                 logger.success(f"Found {len(sources)} relevant sources from RAG")
                 for i, source in enumerate(sources, 1):
-                    logger.debug(f"  Source {i}: {source['filename']} (similarity: {source['similarity']:.3f})")
+                    if source['similarity'] is not None:
+                        logger.debug(f"  Source {i}: {source['filename']} (similarity: {source['similarity']:.3f})")
+                    else:
+                        logger.debug(f"  Source {i}: {source['filename']} (lexical match)")
             else:
                 logger.info("No relevant RAG context found")
         
@@ -259,6 +284,15 @@ async def chat_with_assistant(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/rag/metrics")
+async def get_rag_metrics():
+    """Get RAG index and query batching metrics."""
+    rag = get_ready_rag_system()
+    if rag is None:
+        return get_rag_status()
+    return rag.get_metrics()
+
+
 @router.post("/upload-image")
 async def upload_image_for_chat(
     file: UploadFile = File(...),
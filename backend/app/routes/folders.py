@@ -5,8 +5,11 @@ from datetime import datetime
 
 from app.models.database import get_database
 from app.models.schemas import Folder
+from app.services.rag_service import get_rag_system_nowait
+from app.utils.logger import get_logger
 
 router = APIRouter(prefix="/api/folders", tags=["folders"])
+logger = get_logger("FOLDERS")
 
 
 @router.get("/", response_model=List[dict])
@@ -97,6 +100,10 @@ async def delete_folder(folder_id: str):
     db = get_database()
     
     try:
+        # Remember the folder's notes so they can be evicted from the RAG index
+        notes = await db.notes.find({"folder_id": folder_id}, {"_id": 1}).to_list(None)
+        note_ids = [str(note["_id"]) for note in notes]
+        
         # Delete all notes in the folder
         await db.notes.delete_many({"folder_id": folder_id})
         
@@ -108,4 +115,13 @@ async def delete_folder(folder_id: str):
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Folder not found")
     
+    # Evict the deleted notes from the RAG index
+    try:
+        rag = get_rag_system_nowait()
+        for note_id in note_ids:
+            await rag.remove_note_from_index(note_id)
+        logger.success(f"Removed {len(note_ids)} notes of folder {folder_id} from RAG index")
+    except Exception as e:
+        logger.error(f"Failed to remove folder notes from RAG: {str(e)}", exc_info=e)
+    
     return {"message": "Folder and its notes deleted successfully"}
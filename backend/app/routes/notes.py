@@ -2,12 +2,13 @@ from fastapi import APIRouter, HTTPException, status, UploadFile, File, Form
 from typing import List, Optional
 from bson import ObjectId
 from datetime import datetime
+import asyncio
 import os
 import shutil
 
 from app.models.database import get_database
 from app.models.schemas import Note
-from app.services.rag_service import get_rag_system
+from app.services.rag_service import get_rag_system_nowait
 from app.services.gemini_service import gemini_service
 from app.services.longcat_service import longcat_service
 from app.utils.file_processor import extract_text_from_file
@@ -60,11 +61,12 @@ async def create_note(note: dict):
     # Add to RAG index
     try:
         logger.info("Adding note to RAG index...")
-        rag = await get_rag_system()
+        rag = get_rag_system_nowait()
         await rag.add_note_to_index(
             note_data["title"], 
             note_data["content"],
-            note_id
+            note_id,
+            note_data["folder_id"]
         )
         logger.success(f"Note added to RAG index successfully")
     except Exception as e:
@@ -130,11 +132,12 @@ async def update_note(note_id: str, note: dict):
     # Update RAG index
     try:
         logger.info("Updating note in RAG index...")
-        rag = await get_rag_system()
+        rag = get_rag_system_nowait()
         await rag.add_note_to_index(
             update_data["title"], 
             update_data["content"],
-            note_id
+            note_id,
+            update_data["folder_id"]
         )
         logger.success("Note updated in RAG index")
     except Exception as e:
@@ -160,6 +163,14 @@ async def delete_note(note_id: str):
         logger.warning(f"Note not found: {note_id}")
         raise HTTPException(status_code=404, detail="Note not found")
     
+    # Evict the note from the RAG index
+    try:
+        rag = get_rag_system_nowait()
+        await rag.remove_note_from_index(note_id)
+        logger.success("Note removed from RAG index")
+    except Exception as e:
+        logger.error(f"Failed to remove note from RAG: {str(e)}", exc_info=e)
+    
     logger.success(f"Note deleted successfully: {note_id}")
     return {"message": "Note deleted successfully"}
 
@@ -188,9 +199,10 @@ async def generate_notes(
                     shutil.copyfileobj(file.file, buffer)
                 temp_files.append(file_path)
                 logger.info(f"Saved file: {file.filename}")
-                
-                # Extract text
-                text = await extract_text_from_file(file_path)
+            
+            # Extract text from all files in parallel in the extraction pool
+            texts = await asyncio.gather(*(extract_text_from_file(path) for path in temp_files))
+            for file, text in zip(files, texts):
                 extracted_text += text + "\n\n"
                 logger.debug(f"Extracted {len(text)} characters from {file.filename}")
         
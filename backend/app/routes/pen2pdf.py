@@ -5,7 +5,6 @@ import os
 import shutil
 
 from app.services.gemini_service import gemini_service
-from app.services.export_service import export_service
 from app.utils.file_processor import extract_text_from_file
 from app.utils.logger import get_logger
 
@@ -94,6 +93,9 @@ async def export_document(
     add_watermark: bool = Form(True)
 ):
     """Export document to PDF, DOCX, or Markdown."""
+    # ReportLab and matplotlib load with the first export, not at startup
+    from app.services.export_service import export_service
+    
     logger.info(f"Received export request: title='{title}', format={format}, watermark={add_watermark}")
     
     try:
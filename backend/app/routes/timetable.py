@@ -2,13 +2,16 @@ from fastapi import APIRouter, HTTPException, status, UploadFile, File
 from typing import List
 from bson import ObjectId
 from datetime import datetime
-import pandas as pd
 import io
 
 from app.models.database import get_database
 from app.models.schemas import Timetable
+from app.utils.lazy_import import lazy_import
 from app.utils.logger import get_logger
 
+# Only needed for spreadsheet uploads
+pd = lazy_import("pandas")
+
 router = APIRouter(prefix="/api/timetable", tags=["timetable"])
 logger = get_logger("TIMETABLE")
 
@@ -1,10 +1,57 @@
 import os
+import re
 from datetime import datetime
 from pathlib import Path
+from typing import Callable, List, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Every entry in history.txt is wrapped in a pair of these lines
+SEPARATOR = '=' * 80
+
+
+def parse_history_entries(data: bytes, base_offset: int = 0) -> Tuple[List[Tuple[int, int, str]], int]:
+    """
+    Split raw history.txt bytes into complete conversation entries.
+    
+    Returns ``(entries, consumed)`` where each entry is ``(start, end, text)``
+    with absolute byte offsets (``base_offset`` is the file position of
+    ``data[0]``) and ``consumed`` is the absolute offset just past the last
+    complete entry. A trailing entry still being written is left unconsumed.
+    """
+    separator = SEPARATOR.encode('utf-8')
+    # Text-mode appends write CRLF line endings on Windows
+    header = re.compile(re.escape(separator) + rb'\r?\nTimestamp:')
+    entries = []
+    pos = 0
+    consumed = 0
+    
+    while True:
+        match = header.search(data, pos)
+        if match is None:
+            break
+        body_start = match.start() + len(separator)
+        closing = data.find(separator, body_start)
+        if closing == -1:
+            break
+        if header.match(data, closing):
+            # Torn entry (opening without a closing separator), skip it
+            pos = closing
+            continue
+        
+        # Entry ends after the closing separator and its trailing newlines
+        end = closing + len(separator)
+        while end < len(data) and data[end:end + 1] in (b'\n', b'\r'):
+            end += 1
+        
+        text = data[body_start:closing].decode('utf-8', errors='replace').replace('\r\n', '\n').strip()
+        if text:
+            entries.append((base_offset + consumed, base_offset + end, text))
+        pos = consumed = end
+    
+    return entries, base_offset + consumed
+
 class ConversationHistoryService:
     """Service to save conversation history to a text file."""
     
@@ -20,6 +67,7 @@ class ConversationHistoryService:
         self.data_dir.mkdir(parents=True, exist_ok=True)
         self.history_file = self.data_dir / "history.txt"
         self.last_modified = None
+        self._listeners: List[Callable[[], None]] = []
         self._check_file_modified()
     
     def _check_file_modified(self) -> bool:
@@ -35,6 +83,16 @@ class ConversationHistoryService:
             return old_mtime is not None  # Return True only if this is an actual update
         return False
     
+    def add_listener(self, callback: Callable[[], None]):
+        """Register a callback invoked after every saved conversation."""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+    
+    def remove_listener(self, callback: Callable[[], None]):
+        """Unregister a callback added with add_listener."""
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+    
     def has_file_been_updated(self) -> bool:
         """Check if the history file has been updated since last check."""
         return self._check_file_modified()
@@ -51,7 +109,7 @@ class ConversationHistoryService:
             
             # Sanitize inputs: preserve content but ensure no corruption of file format
             # Remove or escape any separator patterns that could break parsing
-            separator = '=' * 80
+            separator = SEPARATOR
             user_message_safe = user_message.replace(separator, '-' * 80)
             assistant_response_safe = assistant_response.replace(separator, '-' * 80)
             model_safe = model.replace('\n', ' ').replace('\r', ' ')
@@ -82,6 +140,13 @@ Model: {model_safe}
             
         except Exception as e:
             logger.error(f"Failed to save conversation to history: {str(e)}")
+            return
+        
+        for callback in list(self._listeners):
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"History listener failed: {str(e)}")
     
     def get_history_file_path(self) -> Path:
         """Get the path to the history file."""
@@ -0,0 +1,94 @@
+import asyncio
+import importlib.util
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Set, Tuple
+
+
+# "auto" uses OS file events (inotify/FSEvents/ReadDirectoryChanges through
+# watchfiles) when installed and polls otherwise; "off" disables watching
+WATCH_MODES = ("auto", "events", "poll", "off")
+
+# Extensions the ingestion path can extract text from
+SUPPORTED_EXTENSIONS = {'.pdf', '.txt', '.md', '.markdown', '.docx'}
+
+
+class DataDirWatcher:
+    """
+    Reports batches of changed files in a directory to ``on_change``.
+
+    Changes are debounced: a batch is delivered once no file in the
+    directory has changed for ``debounce_ms``, so a file that is still being
+    copied or saved in several writes is only reported once it settles.
+    Only the top level of the directory is watched, like the startup scan.
+    """
+
+    def __init__(self, directory: Path, on_change: Callable[[Set[Path]], Awaitable[None]],
+                 mode: str = "auto", debounce_ms: int = 1000, poll_seconds: float = 2.0):
+        self.directory = Path(directory)
+        self.on_change = on_change
+        self.mode = mode if mode in WATCH_MODES else "auto"
+        self.debounce_ms = debounce_ms
+        self.poll_seconds = poll_seconds
+
+    @property
+    def uses_events(self) -> bool:
+        if self.mode == "poll":
+            return False
+        available = importlib.util.find_spec("watchfiles") is not None
+        if self.mode == "events" and not available:
+            print("watchfiles is not installed, polling the data directory instead")
+        return available
+
+    async def run(self):
+        if self.mode == "off":
+            return
+        if self.uses_events:
+            await self._watch_events()
+        else:
+            await self._poll()
+
+    async def _watch_events(self):
+        import watchfiles
+
+        print(f"Watching {self.directory} for changes")
+        async for changes in watchfiles.awatch(self.directory, debounce=self.debounce_ms, recursive=False):
+            await self._deliver({Path(path) for _, path in changes})
+
+    async def _poll(self):
+        """Fallback for platforms or filesystems without change events."""
+        print(f"Polling {self.directory} for changes every {self.poll_seconds}s")
+        known = self._stat_all()
+        changed: Set[Path] = set()
+        last_change = 0.0
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            current = self._stat_all()
+            delta = {path for path in known.keys() | current.keys() if known.get(path) != current.get(path)}
+            known = current
+            if delta:
+                changed |= delta
+                last_change = time.monotonic()
+            elif changed and (time.monotonic() - last_change) * 1000 >= self.debounce_ms:
+                batch, changed = changed, set()
+                await self._deliver(batch)
+
+    async def _deliver(self, paths: Set[Path]):
+        paths = {path for path in paths if path.suffix.lower() in SUPPORTED_EXTENSIONS}
+        if not paths:
+            return
+        try:
+            await self.on_change(paths)
+        except Exception as e:
+            print(f"Error syncing changed files: {e}")
+
+    def _stat_all(self) -> Dict[Path, Tuple[int, int]]:
+        entries = {}
+        for path in self.directory.iterdir():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue  # Deleted while listing
+            if path.is_file():
+                entries[path] = (stat.st_mtime_ns, stat.st_size)
+        return entries
@@ -0,0 +1,90 @@
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from app.config import settings
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+
+# "torch" runs the stock PyTorch model, "onnx" an exported ONNX Runtime graph
+EMBEDDING_BACKENDS = ("torch", "onnx")
+
+# Dynamic int8 quantization presets understood by sentence-transformers
+ONNX_QUANTIZATION_PRESETS = ("arm64", "avx2", "avx512", "avx512_vnni")
+
+
+def embedding_model_id(model_name: str) -> str:
+    """
+    Identity of the vectors the configured backend produces.
+
+    The float ONNX graph reproduces the PyTorch model, so both share cached
+    embeddings; an int8 model gets its own cache entries.
+    """
+    quantization = settings.rag_onnx_quantization
+    if settings.rag_embedding_backend == "onnx" and quantization:
+        return f"{model_name}#onnx-int8-{quantization}"
+    return model_name
+
+
+def load_embedding_model(model_name: str, models_dir: Path) -> "SentenceTransformer":
+    """
+    Load the sentence transformer on the configured CPU inference backend.
+
+    The ONNX export (and its quantized variant) is created once under
+    ``models_dir`` and reused on later starts. sentence-transformers (and
+    with it torch) is only imported here, off the server's startup path.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    backend = settings.rag_embedding_backend
+    if backend not in EMBEDDING_BACKENDS:
+        print(f"Unknown embedding backend '{backend}', falling back to torch")
+        backend = "torch"
+
+    if backend == "torch":
+        if settings.rag_embedding_threads > 0:
+            import torch
+            torch.set_num_threads(settings.rag_embedding_threads)
+        return SentenceTransformer(model_name)
+    return _load_onnx_model(model_name, Path(models_dir))
+
+
+def _load_onnx_model(model_name: str, models_dir: Path) -> "SentenceTransformer":
+    import onnxruntime
+    from sentence_transformers import SentenceTransformer
+
+    export_dir = models_dir / f"{model_name.split('/')[-1]}-onnx"
+    model_kwargs = {'provider': "CPUExecutionProvider"}
+
+    if not (export_dir / "onnx" / "model.onnx").exists():
+        print(f"Exporting {model_name} to ONNX in {export_dir}...")
+        model = SentenceTransformer(model_name, backend="onnx", model_kwargs=model_kwargs)
+        model.save_pretrained(str(export_dir))
+
+    file_name = "onnx/model.onnx"
+    quantization = settings.rag_onnx_quantization
+    if quantization:
+        if quantization not in ONNX_QUANTIZATION_PRESETS:
+            raise ValueError(
+                f"Unknown ONNX quantization '{quantization}', "
+                f"expected one of {', '.join(ONNX_QUANTIZATION_PRESETS)}"
+            )
+        file_name = f"onnx/model_int8_{quantization}.onnx"
+        if not (export_dir / file_name).exists():
+            from sentence_transformers import export_dynamic_quantized_onnx_model
+            print(f"Quantizing the ONNX model to int8 ({quantization})...")
+            model = SentenceTransformer(str(export_dir), backend="onnx", model_kwargs=dict(model_kwargs))
+            export_dynamic_quantized_onnx_model(model, quantization, str(export_dir), file_suffix=f"int8_{quantization}")
+
+    session_options = onnxruntime.SessionOptions()
+    if settings.rag_embedding_threads > 0:
+        session_options.intra_op_num_threads = settings.rag_embedding_threads
+    # One request runs one graph at a time; parallelism comes from intra-op threads
+    session_options.inter_op_num_threads = 1
+
+    return SentenceTransformer(
+        str(export_dir),
+        backend="onnx",
+        model_kwargs={**model_kwargs, 'file_name': file_name, 'session_options': session_options}
+    )
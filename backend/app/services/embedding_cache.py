@@ -0,0 +1,111 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed cache of chunk embeddings.
+
+    Entries are keyed by a SHA-256 of (model name, chunk text), so identical
+    chunks coming from re-saved notes or a re-read history.txt cost a lookup
+    instead of a forward pass. The cache is bounded to ``max_entries`` and
+    evicts the least recently used vectors first.
+
+    The database is opened on first use. A ``read_only`` cache (reader
+    worker processes) never creates, updates or evicts anything.
+    """
+
+    def __init__(self, path: Path, model_name: str, dimension: int, max_entries: int = 50000,
+                 read_only: bool = False):
+        self.path = Path(path)
+        self.model_name = model_name
+        self.dimension = dimension
+        self.max_entries = max_entries
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None:
+            if self.read_only:
+                if not self.path.exists():
+                    return None
+                self._conn = sqlite3.connect(f"{self.path.as_uri()}?mode=ro", uri=True,
+                                             check_same_thread=False, timeout=30)
+                return self._conn
+            # Reader workers may have the file open
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+            self._conn.commit()
+        return self._conn
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode('utf-8')).hexdigest()
+
+    def get_many(self, texts: List[str]) -> Dict[str, np.ndarray]:
+        """Return cached vectors for the given texts, keyed by cache key."""
+        keys = list({self.key(text) for text in texts})
+        found: Dict[str, np.ndarray] = {}
+
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return found
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype='float32')
+
+            if found and not self.read_only:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                conn.commit()
+
+        return found
+
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        """Store vectors for the given texts and evict old entries if needed."""
+        if self.read_only or self.max_entries <= 0 or not texts:
+            return
+
+        vectors = np.asarray(vectors, dtype='float32').reshape(len(texts), self.dimension)
+        now = time.time()
+        rows = [(self.key(text), vector.tobytes(), now) for text, vector in zip(texts, vectors)]
+
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,206 @@
+import json
+import os
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+
+class EmbeddingStore:
+    """
+    Raw embedding matrix persisted next to the FAISS index.
+
+    Rows are stored back to back in a flat binary file and read through a
+    read-only memory map, so rebuilding or migrating the index reads vectors
+    at I/O speed instead of re-running the embedding model. Live row ``i``
+    always belongs to metadata row ``i`` (``ChunkMetadataStore``).
+
+    Deleted rows are tombstoned rather than cut out of the file, so a
+    removal costs O(removed) like the FAISS tombstones; positions are mapped
+    past the tombstones on read. The file is compacted at checkpoint time
+    once dead rows make up a large enough share of it, and the tombstones
+    are persisted with the checkpoint in the ``.json`` sidecar.
+
+    Constructing a store never writes; the index writer calls ``open``
+    before modifying it, every other process only reads.
+    """
+
+    COPY_BATCH_ROWS = 8192
+
+    # Rewrite the file once tombstoned rows reach this share of it
+    COMPACT_DEAD_FRACTION = 0.25
+    COMPACT_MIN_DEAD_ROWS = 1024
+
+    def __init__(self, path: Path, dimension: int, dtype: str = "float32", read_only: bool = False):
+        self.path = Path(path)
+        self.meta_path = self.path.with_suffix(".json")
+        self.dimension = dimension
+        self.dtype = np.dtype(dtype)
+        self.read_only = read_only
+        self._matrix: Optional[np.memmap] = None
+        # Sorted physical positions of deleted rows
+        self._dead = np.empty(0, dtype='int64')
+        # Last write-ahead log entry whose removals are in the persisted
+        # tombstones; None when the file itself is already up to date
+        self.checkpoint_seq: Optional[int] = None
+
+        meta = {}
+        if self.meta_path.exists():
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+
+        if read_only:
+            # Snapshot view: map the rows of the checkpoint and never touch the
+            # file again, it may be unlinked or appended to by the writer
+            if 'dtype' in meta:
+                self.dtype = np.dtype(meta['dtype'])
+            on_disk = self.path.stat().st_size // self.row_bytes if self.path.exists() else 0
+            self._rows = min(meta.get('rows', on_disk), on_disk)
+            self._dead = self._valid_dead(meta.get('dead', []), self._rows)
+            if self._rows:
+                self._matrix = np.memmap(self.path, dtype=self.dtype, mode='r', shape=(self._rows, self.dimension))
+            return
+
+        # Stored with another model/settings, discarded by open()
+        self._stale_layout = bool(meta) and (meta.get('dimension') != dimension or meta.get('dtype') != self.dtype.name)
+        if not self._stale_layout:
+            self._dead = self._valid_dead(meta.get('dead', []), self._physical_rows())
+            self.checkpoint_seq = meta.get('checkpoint_seq')
+
+    def open(self):
+        """Take over the files for writing, starting over if their layout is stale."""
+        if self._stale_layout:
+            print("Embedding store layout changed, discarding stored vectors")
+            self._stale_layout = False
+            self._write_rows(np.empty((0, self.dimension), dtype=self.dtype))
+            return
+        self._write_meta()
+
+    @property
+    def row_bytes(self) -> int:
+        return self.dimension * self.dtype.itemsize
+
+    def __len__(self) -> int:
+        return self._physical_rows() - len(self._dead)
+
+    @property
+    def dead_rows(self) -> int:
+        return len(self._dead)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """All live rows; a memory-mapped view unless rows are tombstoned."""
+        matrix = self._mapped()
+        if len(self._dead):
+            return matrix[self._physical(np.arange(len(self)))]
+        return matrix
+
+    def get_rows(self, positions: Iterable[int]) -> np.ndarray:
+        """Return the requested rows as float32."""
+        positions = np.asarray(list(positions), dtype='int64')
+        return np.asarray(self._mapped()[self._physical(positions)], dtype='float32')
+
+    def iter_batches(self, batch_rows: int = COPY_BATCH_ROWS):
+        """Yield ``(start, float32 rows)`` batches without loading the whole matrix."""
+        for start in range(0, len(self), batch_rows):
+            yield start, self.get_rows(range(start, min(start + batch_rows, len(self))))
+
+    def append(self, vectors: np.ndarray):
+        """Append rows to the end of the store."""
+        vectors = np.ascontiguousarray(vectors, dtype=self.dtype).reshape(-1, self.dimension)
+        if len(vectors) == 0:
+            return
+        self._release()
+
+        # Drop any torn row left behind by an interrupted write first
+        if self.path.exists() and self.path.stat().st_size % self.row_bytes:
+            with open(self.path, 'r+b') as f:
+                f.truncate(self._physical_rows() * self.row_bytes)
+
+        with open(self.path, 'ab') as f:
+            f.write(vectors.tobytes())
+
+    def delete_rows(self, positions: Iterable[int]):
+        """Tombstone rows by position; the remaining rows keep their order."""
+        positions = np.asarray(list(positions), dtype='int64')
+        positions = positions[(positions >= 0) & (positions < len(self))]
+        if len(positions):
+            self._dead = np.union1d(self._dead, self._physical(positions))
+
+    def checkpoint(self, seq: int):
+        """Compact the file if it is mostly dead, then persist the tombstones."""
+        physical = self._physical_rows()
+        if len(self._dead) >= max(self.COMPACT_MIN_DEAD_ROWS, physical * self.COMPACT_DEAD_FRACTION):
+            print(f"Compacting embedding store ({len(self._dead)} deleted rows dropped)")
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, 'wb') as f:
+                for _, batch in self.iter_batches():
+                    f.write(batch.astype(self.dtype).tobytes())
+            self._release()
+            os.replace(tmp_path, self.path)
+            self._dead = np.empty(0, dtype='int64')
+        self.checkpoint_seq = seq
+        self._write_meta()
+
+    def reset(self, vectors: Optional[np.ndarray] = None):
+        """Replace the store contents with ``vectors`` (or empty it)."""
+        if vectors is None:
+            vectors = np.empty((0, self.dimension), dtype=self.dtype)
+        self._write_rows(np.asarray(vectors).reshape(-1, self.dimension))
+
+    def _physical_rows(self) -> int:
+        if self.read_only:
+            return self._rows
+        if not self.path.exists():
+            return 0
+        # A partially written trailing row (e.g. after a crash) is ignored
+        return self.path.stat().st_size // self.row_bytes
+
+    def _physical(self, positions: np.ndarray) -> np.ndarray:
+        """Map live row positions to file rows, skipping the tombstones."""
+        if not len(self._dead):
+            return positions
+        # Live rows before the j-th tombstone: dead[j] - j
+        shifted = self._dead - np.arange(len(self._dead))
+        return positions + np.searchsorted(shifted, positions, side='right')
+
+    def _mapped(self) -> np.ndarray:
+        count = self._physical_rows()
+        if count == 0:
+            return np.empty((0, self.dimension), dtype=self.dtype)
+        if self._matrix is None or self._matrix.shape[0] != count:
+            self._matrix = np.memmap(self.path, dtype=self.dtype, mode='r', shape=(count, self.dimension))
+        return self._matrix
+
+    @staticmethod
+    def _valid_dead(dead, rows: int) -> np.ndarray:
+        dead = np.unique(np.asarray(dead, dtype='int64'))
+        return dead[dead < rows]
+
+    def _write_rows(self, vectors: np.ndarray):
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(np.ascontiguousarray(vectors, dtype=self.dtype).tobytes())
+        self._release()
+        os.replace(tmp_path, self.path)
+        # The file now holds exactly the live rows
+        self._dead = np.empty(0, dtype='int64')
+        self.checkpoint_seq = None
+        self._write_meta()
+
+    def _write_meta(self):
+        # Replaced rather than rewritten, published snapshots link the old file
+        tmp_path = self.meta_path.with_suffix(".json.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'dimension': self.dimension,
+                'dtype': self.dtype.name,
+                'rows': self._physical_rows(),
+                'dead': self._dead.tolist(),
+                'checkpoint_seq': self.checkpoint_seq
+            }, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _release(self):
+        """Drop the cached memory map before the file is modified."""
+        self._matrix = None
@@ -1,14 +1,21 @@
 import os
-import google.generativeai as genai_legacy
 from app.config import settings
+from app.utils.lazy_import import lazy_import
+
+genai_legacy = lazy_import("google.generativeai")
 
 class GeminiService:
     def __init__(self):
         self.api_key = settings.gemini_api_key
-        if self.api_key:
-            genai_legacy.configure(api_key=self.api_key)
-        else:
+        if not self.api_key:
             self.api_key = None
+        self._configured = False
+
+    def _configure(self):
+        """Configure the SDK on first use so importing it stays off the startup path."""
+        if not self._configured:
+            genai_legacy.configure(api_key=self.api_key)
+            self._configured = True
 
     async def generate_text(
         self, 
@@ -20,6 +27,7 @@ class GeminiService:
             return "Error: Gemini API key not configured"
         
         try:
+            self._configure()
             contents = [prompt]
             
             if file_paths:
@@ -0,0 +1,143 @@
+import asyncio
+import base64
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional
+
+import numpy as np
+
+
+def encode_vectors(vectors: np.ndarray) -> str:
+    return base64.b64encode(np.ascontiguousarray(vectors, dtype='float32').tobytes()).decode('ascii')
+
+
+def decode_vectors(data: str, dimension: int) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype='float32').reshape(-1, dimension)
+
+
+class WriteAheadLog:
+    """
+    Append-only log of index mutations made since the last checkpoint.
+
+    Every entry is one JSON line with a monotonically increasing ``seq`` and is
+    fsynced before the mutation is applied in memory. On startup, entries
+    newer than the checkpoint's sequence number are replayed, so changes made
+    between two checkpoints survive a crash. A torn trailing line (a crash
+    mid-append) is ignored.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.last_seq = 0
+        for entry in self.entries():
+            self.last_seq = entry['seq']
+
+    def append(self, op: str, **fields) -> int:
+        self.last_seq += 1
+        line = json.dumps({'seq': self.last_seq, 'op': op, **fields})
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        return self.last_seq
+
+    def entries(self) -> Iterator[Dict]:
+        """Logged entries in order, including the checkpoint marker."""
+        if not self.path.exists():
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                yield entry
+
+    def reset(self):
+        """Drop all entries after a checkpoint, keeping the sequence number."""
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'seq': self.last_seq, 'op': 'checkpoint'}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+class DebouncedCheckpointer:
+    """
+    Coalesces index mutations into periodic checkpoints.
+
+    Callers report each mutation with ``mark_dirty``. A background task writes
+    a checkpoint ``interval_seconds`` after the first unsaved change, or right
+    away once ``max_pending`` changes have piled up, so bulk imports rewrite
+    the store once instead of once per document. Without a running event loop
+    every change is checkpointed immediately.
+    """
+
+    def __init__(self, checkpoint: Callable[[], None], run_in_executor,
+                 interval_seconds: float = 5.0, max_pending: int = 50):
+        self.checkpoint = checkpoint
+        self.run_in_executor = run_in_executor
+        self.interval = max(0.0, interval_seconds)
+        self.max_pending = max(1, max_pending)
+        self.pending = 0
+        self.checkpoints = 0
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._event: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the timer task on the running event loop."""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._loop = None
+
+    def mark_dirty(self):
+        """Record one mutation; may be called from any thread."""
+        with self._lock:
+            self.pending += 1
+            pending = self.pending
+
+        if pending >= self.max_pending or self._loop is None or self._loop.is_closed():
+            self.flush()
+        else:
+            self._loop.call_soon_threadsafe(self._event.set)
+
+    def flush(self):
+        """Write a checkpoint now if anything changed since the last one."""
+        with self._lock:
+            pending, self.pending = self.pending, 0
+        if not pending:
+            return
+        try:
+            self.checkpoint()
+            self.checkpoints += 1
+        except Exception:
+            with self._lock:
+                self.pending += pending
+            raise
+
+    async def _run(self):
+        while True:
+            await self._event.wait()
+            await asyncio.sleep(self.interval)
+            self._event.clear()
+            try:
+                await self.run_in_executor(self.flush)
+            except Exception as e:
+                print(f"Error writing index checkpoint: {e}")
@@ -0,0 +1,161 @@
+import json
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+# Worker roles. A "single" process owns the store on its own; otherwise one
+# writer ingests and publishes snapshots and any number of readers serve
+# searches from them.
+WORKER_ROLES = ("single", "auto", "writer", "reader")
+
+
+class WriterLock:
+    """
+    Exclusive advisory lock marking the one process allowed to write the store.
+
+    The lock is held for the life of the process and released by the OS
+    when it exits, so a restarted worker can take over from a dead writer.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = None
+
+    @staticmethod
+    def supported() -> bool:
+        return fcntl is not None
+
+    def acquire(self, blocking: bool = False) -> bool:
+        if self._file is not None:
+            return True
+        f = open(self.path, 'a+')
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except OSError:
+            f.close()
+            return False
+        f.seek(0)
+        f.truncate()
+        f.write(str(os.getpid()))
+        f.flush()
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class SnapshotStore:
+    """
+    Versioned, immutable copies of the index files for reader processes.
+
+    ``publish`` hard-links the current files into a new ``v<N>`` directory
+    (falling back to a copy where links are not supported) and then points
+    ``CURRENT`` at it with an atomic rename. The writer replaces files by
+    renaming new ones into place and only ever appends to the embedding and
+    chunk text files, so a published snapshot never changes underneath a
+    reader. Superseded snapshots are deleted once they are older than the
+    retention period, which leaves readers time to swap.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.current_path = self.root / "CURRENT"
+
+    def current(self) -> Optional[Tuple[str, Path]]:
+        """``(version, directory)`` of the latest published snapshot."""
+        try:
+            version = self.current_path.read_text(encoding='utf-8').strip()
+        except FileNotFoundError:
+            return None
+        return (version, self.root / version) if version else None
+
+    def publish(self, files: Dict[str, Path]) -> str:
+        """Publish ``{relative name: source path}`` as a new snapshot version."""
+        version = f"v{self._last_version() + 1}"
+        tmp_dir = self.root / f"tmp-{version}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        for name, source in files.items():
+            target = tmp_dir / name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.link(source, target)
+            except OSError:
+                shutil.copy2(source, target)
+        os.rename(tmp_dir, self.root / version)
+
+        previous = self.current()
+        tmp_current = self.current_path.with_suffix(".tmp")
+        with open(tmp_current, 'w', encoding='utf-8') as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_current, self.current_path)
+        if previous is not None and previous[1].exists():
+            # Retention counts from when a snapshot was superseded
+            os.utime(previous[1])
+        return version
+
+    def collect_garbage(self, retention_seconds: float):
+        """Delete superseded snapshots that have been replaced for long enough."""
+        current = self.current()
+        current_version = current[0] if current else None
+        cutoff = time.time() - retention_seconds
+        for path in self.root.iterdir():
+            if not path.is_dir() or path.name == current_version:
+                continue
+            if path.stat().st_mtime < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _last_version(self) -> int:
+        versions = [int(path.name[1:]) for path in self.root.glob("v*") if path.name[1:].isdigit()]
+        return max(versions, default=0)
+
+
+class IngestInbox:
+    """
+    Spool directory through which reader processes hand index mutations
+    (note saves and deletes, new conversations) to the writer.
+
+    Each job is one JSON file, written under a temporary name and renamed
+    into place so the writer never sees a partial job. File names start with
+    a nanosecond timestamp, so jobs are applied in submission order.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def submit(self, op: str, **fields):
+        name = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        tmp_path = self.path / f"{name}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'op': op, **fields}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path / f"{name}.json")
+
+    def pending(self) -> Iterator[Tuple[Path, Dict]]:
+        """Queued ``(path, job)`` pairs, oldest first; delete a path once its job is applied."""
+        for path in sorted(self.path.glob("*.json")):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    job = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Dropping unreadable ingest job {path.name}: {e}")
+                path.unlink(missing_ok=True)
+                continue
+            yield path, job
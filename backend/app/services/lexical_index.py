@@ -0,0 +1,326 @@
+import math
+import os
+import pickle
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.metadata_store import text_hash
+
+
+# Words, numbers and compound identifiers such as "cs-101", "x_max" or "v1.2"
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[._\-][a-z0-9]+)*")
+
+# Arrays of a base segment, each saved as base.<generation>.<name>.npy
+SEGMENT_ARRAYS = {
+    'term_hashes': 'uint64',   # sorted 64-bit hashes of the terms
+    'term_offsets': 'int64',   # postings of term i are [term_offsets[i], term_offsets[i + 1])
+    'posting_docs': 'int32',   # position of the chunk in doc_ids
+    'posting_tfs': 'uint16',   # term frequency in the chunk
+    'doc_ids': 'int64',        # sorted chunk IDs
+    'doc_lengths': 'int32'     # terms per chunk
+}
+
+MAX_TERM_FREQUENCY = np.iinfo('uint16').max
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased terms of ``text``.
+
+    Compound identifiers are indexed whole and by their parts, so "CS-101"
+    matches queries for "cs-101", "cs 101" and "101".
+    """
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        terms.append(token)
+        parts = re.split(r"[._\-]", token)
+        if len(parts) > 1:
+            terms.extend(part for part in parts if part)
+    return terms
+
+
+def _empty_segment() -> Dict[str, np.ndarray]:
+    segment = {name: np.empty(0, dtype=dtype) for name, dtype in SEGMENT_ARRAYS.items()}
+    segment['term_offsets'] = np.zeros(1, dtype='int64')
+    return segment
+
+
+class LexicalIndex:
+    """
+    Incrementally maintained BM25 inverted index over chunk IDs.
+
+    Complements the embedding index for exact-term queries (course codes,
+    formula names, identifiers) that dense retrieval ranks poorly.
+
+    Postings live in an immutable base segment of CSR arrays (one ``.npy``
+    file each, memory-mapped, so reader processes share them through the
+    page cache) plus a small in-memory delta of chunks added since the
+    segment was written and tombstones for removed ones. Checkpoints only
+    write the delta; the delta is merged into a new base segment once it
+    grows past ``MERGE_FRACTION`` of the base.
+    """
+
+    MERGE_FRACTION = 0.1
+    MERGE_MIN_CHANGES = 2000
+
+    def __init__(self, directory: Path, k1: float = 1.5, b: float = 0.75):
+        self.directory = Path(directory)
+        self.delta_path = self.directory / "delta.pkl"
+        self.k1 = k1
+        self.b = b
+        # Last write-ahead log entry included in the saved postings
+        self.checkpoint_seq = 0
+        self.generation = 0
+        self.clear()
+
+    def __len__(self) -> int:
+        return self._base_live + len(self.delta_lengths)
+
+    def __contains__(self, chunk_id: int) -> bool:
+        if chunk_id in self.delta_lengths:
+            return True
+        position = self._base_position(chunk_id)
+        return position is not None and not self._deleted[position]
+
+    @property
+    def term_count(self) -> int:
+        """Distinct terms, counting terms only in the delta once."""
+        base = self.base['term_hashes']
+        if not len(base):
+            return len(self.delta_postings)
+        terms = np.fromiter(self.delta_postings.keys(), dtype='uint64', count=len(self.delta_postings))
+        known = base[np.minimum(np.searchsorted(base, terms), len(base) - 1)] == terms
+        return len(base) + int((~known).sum())
+
+    def clear(self):
+        self.base = _empty_segment()
+        self._deleted = np.zeros(0, dtype=bool)
+        self._base_live = 0
+        self._base_dirty = True
+        # Chunks added since the base segment: term hash -> {chunk_id: tf}
+        self.delta_postings: Dict[int, Dict[int, int]] = {}
+        self.delta_lengths: Dict[int, int] = {}
+        self.total_length = 0
+
+    def add(self, chunk_id: int, text: str):
+        if chunk_id in self.delta_lengths or self._base_position(chunk_id) is not None:
+            return
+        terms = tokenize(text)
+        for term, count in Counter(terms).items():
+            self.delta_postings.setdefault(text_hash(term), {})[chunk_id] = count
+        self.delta_lengths[chunk_id] = len(terms)
+        self.total_length += len(terms)
+
+    def add_many(self, chunk_ids: Iterable[int], texts: Iterable[str]):
+        for chunk_id, text in zip(chunk_ids, texts):
+            self.add(int(chunk_id), text)
+
+    def remove(self, chunk_id: int, text: str):
+        """Drop a chunk; ``text`` is the chunk text it was indexed with."""
+        length = self.delta_lengths.pop(chunk_id, None)
+        if length is not None:
+            self.total_length -= length
+            for term in {text_hash(term) for term in tokenize(text)}:
+                postings = self.delta_postings.get(term)
+                if postings is None:
+                    continue
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self.delta_postings[term]
+            return
+
+        # Chunks in the base segment are only tombstoned
+        position = self._base_position(chunk_id)
+        if position is None or self._deleted[position]:
+            return
+        self._deleted[position] = True
+        self._base_live -= 1
+        self.total_length -= int(self.base['doc_lengths'][position])
+
+    def search(self, query: str, k: int,
+               allowed: Optional[Callable[[int], bool]] = None) -> List[Tuple[int, float]]:
+        """Top ``k`` ``(chunk_id, score)`` pairs by BM25 score."""
+        count = len(self)
+        if not count:
+            return []
+
+        average_length = self.total_length / count or 1.0
+        base = self.base
+        id_parts, score_parts = [], []
+        for term in {text_hash(term) for term in tokenize(query)}:
+            docs, tfs = self._base_postings(term)
+            delta = self.delta_postings.get(term, {})
+            frequency = len(docs) + len(delta)
+            if not frequency:
+                continue
+            idf = math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+
+            chunk_ids = np.concatenate((base['doc_ids'][docs],
+                                        np.fromiter(delta.keys(), dtype='int64', count=len(delta))))
+            tfs = np.concatenate((tfs.astype('float64'), np.fromiter(delta.values(), dtype='float64', count=len(delta))))
+            lengths = np.concatenate((base['doc_lengths'][docs].astype('float64'),
+                                      [self.delta_lengths[chunk_id] for chunk_id in delta]))
+            norm = self.k1 * (1 - self.b + self.b * lengths / average_length)
+            id_parts.append(chunk_ids)
+            score_parts.append(idf * tfs * (self.k1 + 1) / (tfs + norm))
+
+        if not id_parts:
+            return []
+        chunk_ids, inverse = np.unique(np.concatenate(id_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+        if allowed is not None:
+            keep = np.fromiter((allowed(int(chunk_id)) for chunk_id in chunk_ids), dtype=bool, count=len(chunk_ids))
+            chunk_ids, scores = chunk_ids[keep], scores[keep]
+        order = np.argsort(-scores, kind='stable')[:k]
+        return [(int(chunk_ids[i]), float(scores[i])) for i in order]
+
+    # ------------------------------------------------------------------
+    # Segments
+    # ------------------------------------------------------------------
+
+    def _base_position(self, chunk_id: int) -> Optional[int]:
+        doc_ids = self.base['doc_ids']
+        if not len(doc_ids):
+            return None
+        position = int(np.searchsorted(doc_ids, chunk_id))
+        if position < len(doc_ids) and doc_ids[position] == chunk_id:
+            return position
+        return None
+
+    def _base_postings(self, term: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Live base ``(doc positions, term frequencies)`` of a term hash."""
+        hashes = self.base['term_hashes']
+        i = int(np.searchsorted(hashes, np.uint64(term)))
+        if i >= len(hashes) or hashes[i] != np.uint64(term):
+            return np.empty(0, dtype='int32'), np.empty(0, dtype='uint16')
+        start, end = self.base['term_offsets'][i], self.base['term_offsets'][i + 1]
+        docs = np.asarray(self.base['posting_docs'][start:end])
+        tfs = np.asarray(self.base['posting_tfs'][start:end])
+        if self._base_live < len(self._deleted):
+            live = ~self._deleted[docs]
+            docs, tfs = docs[live], tfs[live]
+        return docs, tfs
+
+    def _pending_changes(self) -> int:
+        return len(self.delta_lengths) + (len(self._deleted) - self._base_live)
+
+    def merge(self):
+        """Fold the delta and the tombstones into a new in-memory base segment."""
+        base = self.base
+        term_counts = np.diff(base['term_offsets'])
+        live = ~self._deleted[base['posting_docs']]
+        terms = np.repeat(base['term_hashes'], term_counts)[live]
+        chunk_ids = base['doc_ids'][base['posting_docs']][live]
+        tfs = np.asarray(base['posting_tfs'])[live]
+
+        delta_terms, delta_ids, delta_tfs = [], [], []
+        for term, postings in self.delta_postings.items():
+            delta_terms.extend([term] * len(postings))
+            delta_ids.extend(postings.keys())
+            delta_tfs.extend(postings.values())
+        terms = np.concatenate((terms, np.array(delta_terms, dtype='uint64')))
+        chunk_ids = np.concatenate((chunk_ids, np.array(delta_ids, dtype='int64')))
+        tfs = np.concatenate((tfs, np.minimum(np.array(delta_tfs, dtype='int64'), MAX_TERM_FREQUENCY)))
+
+        doc_live = ~self._deleted
+        doc_ids = np.concatenate((base['doc_ids'][doc_live], np.fromiter(self.delta_lengths.keys(), dtype='int64')))
+        doc_lengths = np.concatenate((base['doc_lengths'][doc_live],
+                                      np.fromiter(self.delta_lengths.values(), dtype='int64')))
+        doc_order = np.argsort(doc_ids)
+        doc_ids, doc_lengths = doc_ids[doc_order], doc_lengths[doc_order]
+
+        order = np.lexsort((chunk_ids, terms))
+        terms = terms[order]
+        unique_terms, starts = np.unique(terms, return_index=True)
+        segment = {
+            'term_hashes': unique_terms,
+            'term_offsets': np.append(starts, len(terms)),
+            'posting_docs': np.searchsorted(doc_ids, chunk_ids[order]),
+            'posting_tfs': tfs[order],
+            'doc_ids': doc_ids,
+            'doc_lengths': doc_lengths
+        }
+        self.base = {name: segment[name].astype(dtype) for name, dtype in SEGMENT_ARRAYS.items()}
+        self._deleted = np.zeros(len(doc_ids), dtype=bool)
+        self._base_live = len(doc_ids)
+        self._base_dirty = True
+        self.delta_postings = {}
+        self.delta_lengths = {}
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _segment_path(self, generation: int, name: str) -> Path:
+        return self.directory / f"base.{generation}.{name}.npy"
+
+    def files(self) -> List[Path]:
+        """The files of the saved index, for publishing snapshots."""
+        return [self.delta_path] + [self._segment_path(self.generation, name) for name in SEGMENT_ARRAYS]
+
+    def save(self):
+        """
+        Write the delta, and a new base segment if it was merged.
+
+        The delta file names the base generation it applies to and is
+        renamed into place last, so a crash leaves the previous save intact.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if self._pending_changes() >= max(self.MERGE_MIN_CHANGES, self._base_live * self.MERGE_FRACTION):
+            self.merge()
+
+        generation = self.generation
+        if self._base_dirty:
+            generation += 1
+            for name in SEGMENT_ARRAYS:
+                np.save(self._segment_path(generation, name), self.base[name])
+
+        tmp_path = self.delta_path.with_suffix(".tmp")
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({
+                'checkpoint_seq': self.checkpoint_seq,
+                'generation': generation,
+                'deleted': self.base['doc_ids'][self._deleted].tolist(),
+                'postings': self.delta_postings,
+                'doc_lengths': self.delta_lengths
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.delta_path)
+
+        if self._base_dirty:
+            self.generation = generation
+            self._base_dirty = False
+            # Serve the new segment from the page cache instead of the heap
+            self.base = self._map_segment(generation)
+            for path in self.directory.glob("base.*.npy"):
+                if not path.name.startswith(f"base.{generation}."):
+                    path.unlink(missing_ok=True)
+
+    def load(self) -> bool:
+        """Load the saved postings; returns False if there is nothing usable on disk."""
+        if not self.delta_path.exists():
+            return False
+        try:
+            with open(self.delta_path, 'rb') as f:
+                data = pickle.load(f)
+            base = self._map_segment(data['generation'])
+        except Exception as e:
+            print(f"Error reading lexical index: {e}")
+            return False
+
+        self.checkpoint_seq = data['checkpoint_seq']
+        self.generation = data['generation']
+        self.base = base
+        self._base_dirty = False
+        self._deleted = np.isin(base['doc_ids'], np.asarray(data['deleted'], dtype='int64'))
+        self._base_live = int((~self._deleted).sum())
+        self.delta_postings = data['postings']
+        self.delta_lengths = data['doc_lengths']
+        self.total_length = int(base['doc_lengths'][~self._deleted].sum()) + sum(self.delta_lengths.values())
+        return True
+
+    def _map_segment(self, generation: int) -> Dict[str, np.ndarray]:
+        return {name: np.load(self._segment_path(generation, name), mmap_mode='r') for name in SEGMENT_ARRAYS}
@@ -0,0 +1,351 @@
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+# Per-chunk columns and their dtypes. Text lives in a separate blob and is
+# referenced by (text_offset, text_length).
+COLUMNS = {
+    'chunk_id': 'int64',
+    'file_idx': 'int32',
+    'chunk_index': 'int32',
+    'text_offset': 'int64',
+    'text_length': 'int32',
+    'text_hash': 'uint64',
+    'byte_start': 'int64',
+    'byte_end': 'int64',
+    'indexed_at': 'float64'
+}
+
+# Per-file attributes, stored once per file instead of on every chunk
+FILE_FIELDS = ('filepath', 'filename', 'file_mtime', 'content_hash', 'chunking', 'note_id', 'folder_id')
+
+
+def text_hash(text: str) -> int:
+    """64-bit content hash used to compare chunk text without reading it."""
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class ChunkMetadataStore:
+    """
+    Columnar, lazily loaded chunk metadata.
+
+    Replaces the pickled list of chunk dicts. Numeric metadata is kept in
+    numpy columns and per-file attributes as a JSON array, both in
+    ``columns.npz``, and chunk text in an append-only UTF-8 blob that is
+    memory-mapped and only decoded for the rows a caller asks for (e.g. the
+    k search hits). File records no chunk refers to are dropped on save.
+
+    Rows are kept in insertion order, aligned with ``EmbeddingStore`` rows.
+    Chunk IDs are handed out in increasing order, so the ``chunk_id`` column
+    stays sorted and lookups by ID are a binary search.
+    """
+
+    # Compact the text blob once dead text outweighs live text by this much
+    COMPACT_MIN_DEAD_BYTES = 1 << 20
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.columns_path = self.directory / "columns.npz"
+        # File records were kept in files.json before they moved into columns.npz
+        self.legacy_files_path = self.directory / "files.json"
+
+        self.generation = 0
+        self.blob_size = 0
+        # Last write-ahead log entry included in the saved columns
+        self.checkpoint_seq = 0
+        self._blob: Optional[np.memmap] = None
+        self._reset_memory()
+
+    # ------------------------------------------------------------------
+    # Basic accessors
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.columns['chunk_id'])
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self.columns['chunk_id']
+
+    @property
+    def blob_path(self) -> Path:
+        return self.directory / f"chunks.{self.generation}.txt"
+
+    def exists(self) -> bool:
+        return self.columns_path.exists()
+
+    def rows_for_ids(self, chunk_ids: Iterable[int]) -> np.ndarray:
+        """Row positions of the given chunk IDs (unknown IDs are skipped)."""
+        chunk_ids = np.asarray(list(chunk_ids), dtype='int64')
+        if len(chunk_ids) == 0 or len(self) == 0:
+            return np.empty(0, dtype='int64')
+        rows = np.searchsorted(self.ids, chunk_ids)
+        rows = np.minimum(rows, len(self) - 1)
+        return rows[self.ids[rows] == chunk_ids]
+
+    def row_of(self, chunk_id: int) -> Optional[int]:
+        rows = self.rows_for_ids([chunk_id])
+        return int(rows[0]) if len(rows) else None
+
+    def file_index(self, filepath: str) -> Optional[int]:
+        return self._file_lookup.get(str(filepath))
+
+    def file_info(self, filepath: str) -> Optional[Dict]:
+        idx = self.file_index(filepath)
+        return dict(self.files[idx]) if idx is not None else None
+
+    def rows_for_file(self, filepath: str) -> np.ndarray:
+        idx = self.file_index(filepath)
+        if idx is None:
+            return np.empty(0, dtype='int64')
+        return np.flatnonzero(self.columns['file_idx'] == idx)
+
+    def rows_for_note(self, note_id: str) -> np.ndarray:
+        file_ids = [i for i, record in enumerate(self.files) if record.get('note_id') == note_id]
+        return np.flatnonzero(np.isin(self.columns['file_idx'], file_ids))
+
+    def rows_matching(self, predicate: Callable[[Dict], bool]) -> np.ndarray:
+        """Row mask of chunks whose file record satisfies ``predicate``."""
+        file_mask = np.array([bool(predicate(record)) for record in self.files] or [False])
+        return file_mask[self.columns['file_idx']]
+
+    def indexed_files(self) -> set:
+        """Paths of files that currently have at least one chunk."""
+        used = np.unique(self.columns['file_idx'])
+        return {self.files[i]['filepath'] for i in used}
+
+    def text(self, row: int) -> str:
+        offset = int(self.columns['text_offset'][row])
+        length = int(self.columns['text_length'][row])
+        return bytes(self._blob_view()[offset:offset + length]).decode('utf-8')
+
+    def texts(self, rows: Iterable[int]) -> List[str]:
+        return [self.text(row) for row in rows]
+
+    def get(self, row: int) -> Dict:
+        """Materialize a chunk as the dict shape used by search results."""
+        record = self.files[int(self.columns['file_idx'][row])]
+        doc = {
+            'chunk_id': int(self.columns['chunk_id'][row]),
+            'filepath': record['filepath'],
+            'filename': record['filename'],
+            'chunk': self.text(row),
+            'chunk_index': int(self.columns['chunk_index'][row]),
+            'timestamp': datetime.utcfromtimestamp(float(self.columns['indexed_at'][row])).isoformat(),
+            'file_mtime': record.get('file_mtime', 0)
+        }
+        for field in ('note_id', 'folder_id'):
+            if record.get(field) is not None:
+                doc[field] = record[field]
+        if self.columns['byte_end'][row] >= 0:
+            doc['byte_start'] = int(self.columns['byte_start'][row])
+            doc['byte_end'] = int(self.columns['byte_end'][row])
+        return doc
+
+    # ------------------------------------------------------------------
+    # Mutations
+    # ------------------------------------------------------------------
+
+    def upsert_file(self, filepath: str, **attributes) -> int:
+        """Create or update a file record and return its index."""
+        filepath = str(filepath)
+        idx = self.file_index(filepath)
+        if idx is None:
+            idx = len(self.files)
+            self.files.append({'filepath': filepath, 'filename': Path(filepath).name, 'file_mtime': 0})
+            self._file_lookup[filepath] = idx
+        self.files[idx].update({key: value for key, value in attributes.items() if key in FILE_FIELDS})
+        return idx
+
+    def append(self, file_idx: int, chunk_ids: np.ndarray, texts: List[str],
+               chunk_indexes: Optional[Iterable[int]] = None,
+               byte_ranges: Optional[List[tuple]] = None,
+               indexed_at: Optional[float] = None):
+        """Append chunks of one file. Text is written to the blob right away."""
+        count = len(texts)
+        if count == 0:
+            return
+
+        encoded = [text.encode('utf-8') for text in texts]
+        lengths = np.array([len(data) for data in encoded], dtype='int64')
+        offsets = self.blob_size + np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+        with open(self.blob_path, 'ab') as f:
+            f.seek(self.blob_size)
+            f.truncate(self.blob_size)
+            f.write(b''.join(encoded))
+        self.blob_size += int(lengths.sum())
+        self._blob = None
+
+        if chunk_indexes is None:
+            chunk_indexes = range(count)
+        if byte_ranges is None:
+            byte_ranges = [(-1, -1)] * count
+        if indexed_at is None:
+            indexed_at = time.time()
+
+        new = {
+            'chunk_id': np.asarray(chunk_ids, dtype='int64'),
+            'file_idx': np.full(count, file_idx),
+            'chunk_index': np.fromiter(chunk_indexes, dtype='int64', count=count),
+            'text_offset': offsets,
+            'text_length': lengths,
+            'text_hash': np.array([text_hash(text) for text in texts], dtype='uint64'),
+            'byte_start': np.array([start for start, _ in byte_ranges]),
+            'byte_end': np.array([end for _, end in byte_ranges]),
+            'indexed_at': np.full(count, indexed_at)
+        }
+        for name, dtype in COLUMNS.items():
+            self.columns[name] = np.concatenate((self.columns[name], new[name].astype(dtype)))
+
+    def delete_rows(self, rows: Iterable[int]):
+        keep = np.ones(len(self), dtype=bool)
+        keep[np.asarray(list(rows), dtype='int64')] = False
+        for name in COLUMNS:
+            self.columns[name] = self.columns[name][keep]
+
+    def prune_files(self) -> int:
+        """Drop file records that no chunk refers to any more; returns how many were dropped."""
+        used = np.unique(self.columns['file_idx'])
+        dropped = len(self.files) - len(used)
+        if not dropped:
+            return 0
+        remap = np.full(len(self.files), -1, dtype='int32')
+        remap[used] = np.arange(len(used), dtype='int32')
+        self.columns['file_idx'] = remap[self.columns['file_idx']]
+        self.files = [self.files[i] for i in used]
+        self._file_lookup = {record['filepath']: i for i, record in enumerate(self.files)}
+        return dropped
+
+    def set_chunk_indexes(self, rows: Iterable[int], values: Iterable[int]):
+        self.columns['chunk_index'][np.asarray(list(rows), dtype='int64')] = np.asarray(list(values))
+
+    def clear(self):
+        """Drop every chunk and file record (persisted on the next save)."""
+        self._reset_memory()
+        self.generation += 1
+        self.blob_size = 0
+        self.blob_path.unlink(missing_ok=True)
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def save(self):
+        """Write columns and file records atomically; compact text if needed."""
+        self._maybe_compact()
+
+        # One file, so records renumbered by prune_files never go out of step with file_idx
+        tmp_columns = self.directory / "columns.tmp.npz"
+        np.savez(
+            tmp_columns,
+            generation=np.array(self.generation),
+            blob_size=np.array(self.blob_size),
+            checkpoint_seq=np.array(self.checkpoint_seq),
+            files=np.frombuffer(json.dumps(self.files).encode('utf-8'), dtype='uint8'),
+            **self.columns
+        )
+        os.replace(tmp_columns, self.columns_path)
+        self.legacy_files_path.unlink(missing_ok=True)
+        self._remove_stale_blobs()
+
+    def load(self):
+        with np.load(self.columns_path) as data:
+            self.generation = int(data['generation'])
+            self.blob_size = int(data['blob_size'])
+            self.checkpoint_seq = int(data['checkpoint_seq']) if 'checkpoint_seq' in data.files else 0
+            self.columns = {name: data[name].astype(dtype) for name, dtype in COLUMNS.items()}
+            files = data['files'].tobytes().decode('utf-8') if 'files' in data.files else None
+        if files is None:
+            with open(self.legacy_files_path, 'r', encoding='utf-8') as f:
+                files = f.read()
+        self.files = json.loads(files)
+        self._file_lookup = {record['filepath']: i for i, record in enumerate(self.files)}
+        self._blob = None
+
+        if self.blob_size and (not self.blob_path.exists() or self.blob_path.stat().st_size < self.blob_size):
+            raise ValueError(f"Chunk text blob {self.blob_path.name} is missing or truncated")
+
+    def pin(self):
+        """Map the text blob now, so it stays readable if the file is unlinked later."""
+        self._blob_view()
+
+    def import_documents(self, documents: List[Dict]):
+        """Load legacy chunk dicts (the old metadata.pkl format)."""
+        self.clear()
+        for doc in documents:
+            file_idx = self.upsert_file(
+                doc['filepath'],
+                filename=doc.get('filename', Path(doc['filepath']).name),
+                file_mtime=doc.get('file_mtime', 0),
+                note_id=doc.get('note_id'),
+                folder_id=doc.get('folder_id')
+            )
+            timestamp = doc.get('timestamp')
+            self.append(
+                file_idx,
+                np.array([doc['chunk_id']]),
+                [doc['chunk']],
+                chunk_indexes=[doc.get('chunk_index', 0)],
+                byte_ranges=[(doc.get('byte_start', -1), doc.get('byte_end', -1))],
+                indexed_at=datetime.fromisoformat(timestamp).replace(tzinfo=timezone.utc).timestamp()
+                if timestamp else None
+            )
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _reset_memory(self):
+        self.columns: Dict[str, np.ndarray] = {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self.files: List[Dict] = []
+        self._file_lookup: Dict[str, int] = {}
+        self._blob = None
+
+    def _blob_view(self) -> np.ndarray:
+        if self.blob_size == 0:
+            return np.empty(0, dtype='uint8')
+        if self._blob is None or len(self._blob) < self.blob_size:
+            self._blob = np.memmap(self.blob_path, dtype='uint8', mode='r', shape=(self.blob_size,))
+        return self._blob
+
+    def _maybe_compact(self):
+        """Rewrite the live text into a new blob generation when it is mostly dead."""
+        live_bytes = int(self.columns['text_length'].sum())
+        dead_bytes = self.blob_size - live_bytes
+        if dead_bytes < self.COMPACT_MIN_DEAD_BYTES or dead_bytes < live_bytes:
+            return
+
+        blob = self._blob_view()
+        new_path = self.directory / f"chunks.{self.generation + 1}.txt"
+        offsets = np.empty(len(self), dtype='int64')
+        position = 0
+        with open(new_path, 'wb') as f:
+            for row in range(len(self)):
+                offset = int(self.columns['text_offset'][row])
+                length = int(self.columns['text_length'][row])
+                f.write(bytes(blob[offset:offset + length]))
+                offsets[row] = position
+                position += length
+
+        self.columns['text_offset'] = offsets
+        self.generation += 1
+        self.blob_size = position
+        self._blob = None
+        print(f"Compacted chunk text blob ({dead_bytes} dead bytes dropped)")
+
+    def _remove_stale_blobs(self):
+        for path in self.directory.glob("chunks.*.txt"):
+            if path != self.blob_path:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
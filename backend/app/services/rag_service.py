@@ -1,12 +1,127 @@
-import os
 import pickle
-from typing import List, Dict, Optional
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import TYPE_CHECKING, Callable, List, Dict, Optional, Tuple
 from pathlib import Path
-import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from datetime import datetime
-from app.utils.file_processor import extract_text_from_file, chunk_text
+from app.config import settings
+from app.services.data_watcher import SUPPORTED_EXTENSIONS, DataDirWatcher
+from app.services.conversation_history_service import (
+    SEPARATOR as HISTORY_SEPARATOR,
+    conversation_history_service,
+    parse_history_entries
+)
+from app.services.embedding_backend import embedding_model_id, load_embedding_model
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embedding_store import EmbeddingStore
+from app.services.lexical_index import LexicalIndex
+from app.services.index_persistence import DebouncedCheckpointer, WriteAheadLog, decode_vectors, encode_vectors
+from app.services.index_snapshots import WORKER_ROLES, IngestInbox, SnapshotStore, WriterLock
+from app.services.reranking import mmr_select
+from app.services.metadata_store import ChunkMetadataStore, text_hash
+from app.services import vector_index
+from app.services.vector_shards import VectorShard, shard_for_record
+from app.utils.chunking import create_chunker
+from app.utils.file_processor import file_content_hash, iter_extracted_documents
+from app.utils.lazy_import import lazy_import
+from app.utils.rw_lock import ReadWriteLock
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+faiss = lazy_import("faiss")
+
+
+SEARCH_MODES = ("dense", "lexical", "hybrid")
+SOURCE_KINDS = ("note", "document", "history")
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int, rrf_k: int = 60) -> List[Tuple[int, float]]:
+    """Merge ranked chunk ID lists by summing 1 / (rrf_k + rank) per list."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, 1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+class QueryEmbeddingBatcher:
+    """
+    Coalesces concurrent query encodes into a single batched forward pass.
+    
+    Queries arriving within ``max_wait_ms`` of each other (up to
+    ``max_batch_size``) are encoded together and the vectors are fanned back
+    out to the waiting callers.
+    """
+    
+    def __init__(self, encode_batch: Callable[[List[str]], np.ndarray], run_in_executor,
+                 max_batch_size: int = 16, max_wait_ms: float = 5.0):
+        self.encode_batch = encode_batch
+        self.run_in_executor = run_in_executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        
+        # Batch occupancy metrics
+        self.batches = 0
+        self.queries = 0
+        self.batch_size_counts: Dict[int, int] = {}
+    
+    async def encode(self, query: str) -> np.ndarray:
+        """Encode one query, sharing the model call with concurrent callers."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, future))
+        
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+        
+        return await future
+    
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        
+        while self._pending:
+            batch = self._pending[:self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size:]
+            asyncio.ensure_future(self._encode(batch))
+    
+    async def _encode(self, batch: List[Tuple[str, asyncio.Future]]):
+        self.batches += 1
+        self.queries += len(batch)
+        self.batch_size_counts[len(batch)] = self.batch_size_counts.get(len(batch), 0) + 1
+        
+        try:
+            vectors = await self.run_in_executor(self.encode_batch, [query for query, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+    
+    def metrics(self) -> Dict:
+        """Batch occupancy statistics since startup."""
+        return {
+            'batches': self.batches,
+            'queries': self.queries,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'mean_batch_size': self.queries / self.batches if self.batches else 0.0,
+            'mean_occupancy': self.queries / (self.batches * self.max_batch_size) if self.batches else 0.0,
+            'batch_size_histogram': dict(sorted(self.batch_size_counts.items()))
+        }
 
 
 class RAGSystem:
@@ -29,262 +144,1600 @@ class RAGSystem:
         self.index_dir.mkdir(parents=True, exist_ok=True)
         self.data_dir.mkdir(parents=True, exist_ok=True)
         
-        # Initialize sentence transformer
-        print("Loading sentence transformer model...")
-        self.model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+        # Sentence transformer is loaded in initialize() so construction stays cheap
+        self.model_name = 'sentence-transformers/all-MiniLM-L6-v2'
+        self.model: Optional["SentenceTransformer"] = None
         self.dimension = 384  # Dimension for all-MiniLM-L6-v2
         
-        # Initialize or load FAISS index
-        self.index: Optional[faiss.Index] = None
-        self.documents: List[Dict] = []
-        self.index_path = self.index_dir / "faiss.index"
-        self.metadata_path = self.index_dir / "metadata.pkl"
+        # Startup indexing progress, reported by the readiness endpoint
+        self.ready = False
+        self.progress: Dict = {
+            'state': 'starting',
+            'files_total': 0,
+            'files_done': 0,
+            'chunks_embedded': 0,
+            'started_at': time.time(),
+            'indexing_started_at': None,
+            'error': None
+        }
+        
+        # Vectors live in independently stored FAISS shards: one per course
+        # folder, plus notes, documents and history. Each shard stores chunks
+        # under their stable IDs so they can be removed without re-encoding
+        # the rest of the corpus.
+        self.shards: Dict[str, VectorShard] = {}
+        self.shard_dir = self.index_dir / "shards"
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        # Emptied shards whose files are deleted at the next checkpoint
+        self._dropped_shards: set = set()
+        # Shards that have to be rebuilt from the embedding store after loading
+        self._stale_shards: set = set()
+        self.next_chunk_id = 0
+        # Single-index store from before sharding, split into shards on load
+        self.legacy_index_path = self.index_dir / "faiss.index"
+        self._legacy_shard: Optional[VectorShard] = None
+        
+        # Columnar chunk metadata; text is read lazily for search hits only.
+        # metadata.pkl is the pre-columnar format, migrated on first load.
+        self.metadata = ChunkMetadataStore(self.index_dir / "metadata")
+        self.legacy_metadata_path = self.index_dir / "metadata.pkl"
+        
+        # BM25 postings over the same chunk IDs, for exact-term queries.
+        # lexical.pkl is the pickled format it replaces, rebuilt on first load.
+        self.lexical = LexicalIndex(self.index_dir / "lexical")
+        self.legacy_lexical_path = self.index_dir / "lexical.pkl"
+        
+        # Embedding and FAISS work runs on a dedicated, bounded executor so the
+        # event loop keeps serving requests. Index mutations hold the lock
+        # exclusively; searches share its read side, so concurrent queries
+        # run in parallel but never see a half-applied change.
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.rag_executor_workers,
+            thread_name_prefix="rag"
+        )
+        self._lock = ReadWriteLock()
+        # Separate pool for the per-shard searches a single query fans out to
+        self._shard_executor = ThreadPoolExecutor(
+            max_workers=settings.rag_shard_search_workers,
+            thread_name_prefix="rag-shard"
+        )
+        
+        # Live history.txt indexing, started once the system is ready
+        self._history_event: Optional[asyncio.Event] = None
+        self._history_task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        
+        # Mutations are logged to a write-ahead log and applied in memory;
+        # the index and metadata are checkpointed to disk in the background
+        self.wal = WriteAheadLog(self.index_dir / "wal.log")
+        self.checkpointer = DebouncedCheckpointer(
+            self._write_checkpoint,
+            self._run_in_executor,
+            settings.rag_checkpoint_interval_seconds,
+            settings.rag_checkpoint_max_pending
+        )
+        
+        # Concurrent chat queries share one encode call
+        self.query_batcher = QueryEmbeddingBatcher(
+            self._encode_queries,
+            self._run_in_executor,
+            settings.rag_query_batch_size,
+            settings.rag_query_batch_wait_ms
+        )
         
+        # Multi-worker mode: one writer process owns ingestion and publishes
+        # versioned snapshots of every checkpoint; reader processes serve
+        # searches from the latest snapshot and queue mutations for the writer
+        self.role = settings.rag_worker_role
+        if self.role not in WORKER_ROLES:
+            print(f"Unknown RAG worker role '{self.role}', running as a single process")
+            self.role = "single"
+        elif self.role != "single" and not WriterLock.supported():
+            print("Multi-worker RAG mode needs fcntl file locks, running as a single process")
+            self.role = "single"
+        self.writer_lock = WriterLock(self.index_dir / "writer.lock")
+        self.snapshots: Optional[SnapshotStore] = None
+        self.inbox: Optional[IngestInbox] = None
+        if self.role != "single":
+            self.snapshots = SnapshotStore(self.index_dir / "snapshots")
+            self.inbox = IngestInbox(self.index_dir / "inbox")
+        # An auto worker reopens them for writing if it wins the writer lock
+        self._open_embedding_stores(writable=self.role in ("single", "writer"))
+        self.snapshot_version: Optional[str] = None
+        # Writer: drains the ingest inbox; reader: watches for new snapshots
+        self._worker_task: Optional[asyncio.Task] = None
+        
+        # Keeps the index in step with files added, edited or deleted in data/
+        self.data_watcher = DataDirWatcher(
+            self.data_dir,
+            self._sync_data_files,
+            settings.rag_watch_mode,
+            settings.rag_watch_debounce_ms,
+            settings.rag_watch_poll_seconds
+        )
+        self._watch_task: Optional[asyncio.Task] = None
+        # Serializes document syncs so a file is never indexed twice at once
+        self._sync_lock = asyncio.Lock()
+        # Note saves (note ID -> fields) and deletes (note ID -> None) that
+        # arrived during startup indexing, applied once the system is ready
+        self._deferred_notes: Dict[str, Optional[Dict]] = {}
+        # Per-note locks (with their number of holders and waiters), so saves
+        # and deletes of one note are applied one at a time and in order
+        self._note_locks: Dict[str, List] = {}
+        
+    def _open_embedding_stores(self, writable: bool):
+        """Open the raw vector store and the embedding cache; only the writer may modify them."""
+        # Raw vectors, row-aligned with the metadata rows
+        self.embeddings = EmbeddingStore(
+            self.index_dir / "embeddings.bin",
+            self.dimension,
+            settings.rag_embedding_dtype,
+            read_only=not writable
+        )
+        # Chunk embeddings keyed by (model, text) so unchanged chunks skip the model
+        self.embedding_cache = EmbeddingCache(
+            self.index_dir / "embedding_cache.sqlite",
+            embedding_model_id(self.model_name),
+            self.dimension,
+            settings.rag_embedding_cache_size,
+            read_only=not writable
+        )
+    
+    async def _run_in_executor(self, func, *args, **kwargs):
+        """Run blocking embedding/index work on the RAG executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+    
     async def initialize(self):
         """Initialize RAG system - load existing index or create new one."""
+        try:
+            await self._initialize()
+        except Exception as e:
+            print(f"Error initializing RAG system: {e}")
+            self.progress['state'] = 'failed'
+            self.progress['error'] = str(e)
+    
+    async def _initialize(self):
+        self.checkpointer.start()
+        if self.role in ("auto", "writer"):
+            # A dedicated writer waits for the lock, in auto mode the first
+            # worker to take it writes and the others read
+            acquired = await self._run_in_executor(self.writer_lock.acquire, self.role == "writer")
+            if acquired and self.embeddings.read_only:
+                self._open_embedding_stores(writable=True)
+            self.role = "writer" if acquired else "reader"
+            print(f"RAG worker role: {self.role}")
+        
+        self.progress['state'] = 'loading_model'
+        print(f"Loading sentence transformer model ({settings.rag_embedding_backend} backend)...")
+        self.model = await self._run_in_executor(load_embedding_model, self.model_name, self.index_dir / "models")
+        
+        if self.role == "reader":
+            await self._initialize_reader()
+            return
+        
         # Load existing index first if it exists
-        if self.index_path.exists() and self.metadata_path.exists():
+        self.progress['state'] = 'loading_index'
+        await self._run_in_executor(self.embeddings.open)
+        if self.metadata.exists() or self.legacy_metadata_path.exists():
             print("Loading existing FAISS index...")
-            self._load_index()
+            await self._run_in_executor(self._load_index)
         else:
             print("No existing index found, creating new one")
-            self.index = faiss.IndexFlatL2(self.dimension)
+            self._reset_shards()
+            self.metadata.clear()
+            self.lexical.clear()
+            self.embeddings.reset()
+            # Empty checkpoint for the write-ahead log to build on
+            self._save_index()
         
-        # Check for history.txt updates specifically
+        # The watcher starts before the scan; changes it sees while data/ is
+        # being indexed wait for the sync lock instead of being lost
         history_file = self.data_dir / "history.txt"
-        await self._check_and_reindex_history(history_file)
+        self._watch_task = asyncio.create_task(self.data_watcher.run())
+        async with self._sync_lock:
+            # Compare data/ with the index first so progress has a total to report
+            new_files, changed_files, deleted_files = await self._run_in_executor(self._plan_data_sync)
+            self.progress.update({
+                'state': 'indexing',
+                'files_total': len(new_files) + len(changed_files) + 1,
+                'files_done': 0,
+                'indexing_started_at': time.time()
+            })
+            
+            # Check for history.txt updates specifically
+            await self._check_and_reindex_history(history_file)
+            self.progress['files_done'] = 1
+            
+            await self._apply_data_sync(new_files, changed_files, deleted_files)
         
-        # Check for other new files
-        new_files = await self._scan_for_new_files()
+        if self.role == "writer":
+            # Checkpoint (and so publish) the state readers start from
+            await self._run_in_executor(self._save_index)
+            self._worker_task = asyncio.create_task(self._inbox_loop())
         
-        if new_files:
-            print(f"Found {len(new_files)} new files to index")
-            await self._add_documents(new_files)
-            
-        print(f"RAG system initialized with {len(self.documents)} documents")
+        self.ready = True
+        self.progress['state'] = 'ready'
+        self._start_history_indexer(history_file)
+        print(f"RAG system initialized with {len(self.metadata)} documents")
+        await self._apply_deferred_notes()
+        # A file changed after the scan listed data/ but before the watcher
+        # took its baseline is seen by neither, so scan once more
+        await self._sync_data_files()
+    
+    async def _initialize_reader(self):
+        """Serve searches from the writer's snapshots instead of indexing."""
+        self.progress['state'] = 'waiting_for_snapshot'
+        while self.snapshots.current() is None:
+            await asyncio.sleep(settings.rag_snapshot_poll_seconds)
+        await self._run_in_executor(self._load_snapshot)
+        
+        self.ready = True
+        self.progress['state'] = 'ready'
+        self._worker_task = asyncio.create_task(self._snapshot_watch_loop())
+        self._start_history_indexer(self.data_dir / "history.txt")
+        print(f"RAG reader initialized with {len(self.metadata)} documents")
+        await self._apply_deferred_notes()
+    
+    def _load_snapshot(self) -> bool:
+        """
+        Swap to the latest published snapshot; returns False if already on it.
+        
+        Shards are memory-mapped read-only, the embedding matrix and chunk
+        text are mapped as well, so the vectors are shared with every other
+        reader through the page cache. The new state is built completely
+        before it replaces the old one under the lock, so searches see
+        either snapshot, never a mix.
+        """
+        current = self.snapshots.current()
+        if current is None or current[0] == self.snapshot_version:
+            return False
+        version, directory = current
+        
+        metadata = ChunkMetadataStore(directory / "metadata")
+        metadata.load()
+        metadata.pin()
+        lexical = LexicalIndex(directory / "lexical")
+        lexical.load()
+        embeddings = EmbeddingStore(directory / "embeddings.bin", self.dimension, read_only=True)
+        shards = {}
+        for path in sorted((directory / "shards").glob("*.index")):
+            shard = VectorShard(path.stem, path.parent, self.dimension)
+            shard.load(metadata.ids, mmap=True)
+            shards[path.stem] = shard
+        
+        with self._lock:
+            self.metadata = metadata
+            self.lexical = lexical
+            self.embeddings = embeddings
+            self.shards = shards
+            self.snapshot_version = version
+        print(f"Serving index snapshot {version} ({len(metadata)} chunks)")
+        return True
+    
+    async def _snapshot_watch_loop(self):
+        while True:
+            await asyncio.sleep(settings.rag_snapshot_poll_seconds)
+            try:
+                await self._run_in_executor(self._load_snapshot)
+            except Exception as e:
+                print(f"Error loading index snapshot: {e}")
+    
+    def _publish_snapshot(self):
+        """Expose the checkpoint just written to reader processes."""
+        files = {f"shards/{path.name}": path for path in self.shard_dir.glob("*.index")}
+        for path in (self.metadata.columns_path, self.metadata.blob_path):
+            if path.exists():
+                files[f"metadata/{path.name}"] = path
+        for path in self.lexical.files():
+            if path.exists():
+                files[f"lexical/{path.name}"] = path
+        for path in (self.embeddings.path, self.embeddings.meta_path):
+            if path.exists():
+                files[path.name] = path
+        self.snapshot_version = self.snapshots.publish(files)
+        self.snapshots.collect_garbage(settings.rag_snapshot_retention_seconds)
+    
+    def _forward_to_writer(self, op: str, **fields) -> bool:
+        """In a reader process, queue a mutation for the writer instead of applying it."""
+        if self.role != "reader":
+            return False
+        self.inbox.submit(op, **fields)
+        print(f"Queued {op} for the index writer")
+        return True
+    
+    async def _inbox_loop(self):
+        """Apply mutations queued by reader processes, oldest first."""
+        while True:
+            await asyncio.sleep(settings.rag_snapshot_poll_seconds)
+            for path, job in list(self.inbox.pending()):
+                try:
+                    await self._apply_ingest_job(job)
+                except Exception as e:
+                    print(f"Error applying ingest job {path.name}: {e}")
+                path.unlink(missing_ok=True)
+    
+    async def _apply_ingest_job(self, job: Dict):
+        op = job.pop('op', None)
+        if op == 'add_note':
+            await self.add_note_to_index(**job)
+        elif op == 'remove_note':
+            await self.remove_note_from_index(**job)
+        elif op == 'add_documents':
+            await self.add_documents([Path(path) for path in job['files']])
+        elif op == 'history':
+            self._on_conversation_saved()
+        else:
+            print(f"Unknown ingest job: {op}")
+    
+    def _start_history_indexer(self, history_file: Path):
+        """Index conversations in the background as they are saved."""
+        if conversation_history_service.get_history_file_path() != history_file:
+            # The saved history belongs to another data directory
+            return
+        self._loop = asyncio.get_running_loop()
+        self._history_event = asyncio.Event()
+        self._history_task = asyncio.create_task(self._history_indexer_loop(history_file))
+        conversation_history_service.add_listener(self._on_conversation_saved)
+    
+    def _on_conversation_saved(self):
+        """history.txt listener; may be called from any thread."""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._history_event.set)
+    
+    async def _history_indexer_loop(self, history_file: Path):
+        """
+        Embed newly saved conversations into the live index.
+        
+        Saves arriving within the batching delay are picked up together, so
+        several exchanges share one encode call. Only the bytes appended since
+        the last indexed offset are read.
+        """
+        while True:
+            await self._history_event.wait()
+            await asyncio.sleep(settings.rag_history_index_delay_ms / 1000)
+            self._history_event.clear()
+            try:
+                if not self._forward_to_writer('history'):
+                    await self._check_and_reindex_history(history_file)
+            except Exception as e:
+                print(f"Error indexing new conversations: {e}")
+    
+    async def stop_background_tasks(self):
+        """Stop the live history indexer, the data watcher, the checkpoint timer and the snapshot/inbox loop."""
+        conversation_history_service.remove_listener(self._on_conversation_saved)
+        for task in (self._history_task, self._watch_task, self._worker_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._history_task = None
+        self._watch_task = None
+        self._worker_task = None
+        await self.checkpointer.stop()
+    
+    def close(self):
+        """Write out pending index changes, then release the executor and the embedding cache."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._shard_executor.shutdown(wait=True)
+        try:
+            self.checkpointer.flush()
+        except Exception as e:
+            print(f"Error saving index on shutdown: {e}")
+        self.embedding_cache.close()
+        self.writer_lock.release()
+    
+    def get_status(self) -> Dict:
+        """Startup indexing progress with an ETA while files are being embedded."""
+        status = {key: value for key, value in self.progress.items() if not key.endswith('_at')}
+        status['ready'] = self.ready
+        status['chunks_indexed'] = len(self.metadata)
+        status['uptime_seconds'] = round(time.time() - self.progress['started_at'], 1)
+        status['worker_role'] = self.role
+        status['snapshot'] = self.snapshot_version
+        
+        eta = None
+        started = self.progress['indexing_started_at']
+        done, total = self.progress['files_done'], self.progress['files_total']
+        status['files_done'] = min(done, total)
+        if not self.ready and started and 0 < done < total:
+            eta = round((time.time() - started) / done * (total - done), 1)
+        status['eta_seconds'] = eta
+        return status
     
     async def _check_and_reindex_history(self, history_file: Path):
-        """Check if history.txt has been updated and reindex only that file."""
+        """
+        Bring history.txt up to date in the index.
+        
+        history.txt is append-only, so only the conversation entries written
+        after the last indexed byte offset are chunked and embedded. The whole
+        file is re-indexed only if it was truncated or rewritten, or when it was
+        indexed by an older version without byte offsets.
+        """
         if not history_file.exists():
             print("No history.txt file found, skipping history reindexing")
             return
         
-        # Get current modification time using Path for consistency
+        history_rows = self.metadata.rows_for_file(str(history_file))
+        indexed_chunks = len(history_rows)
+        indexed_offset = int(self.metadata.columns['byte_end'][history_rows].max()) if indexed_chunks else 0
+        
+        if indexed_offset < 0 or not await self._run_in_executor(
+                self._history_prefix_intact, history_file, indexed_offset):
+            print("history.txt was rewritten, reindexing it from the start")
+            await self._remove_document_from_index(str(history_file))
+            indexed_chunks = 0
+            indexed_offset = 0
+        
         current_mtime = history_file.stat().st_mtime
+        data = await self._run_in_executor(self._read_bytes_from, history_file, indexed_offset)
+        entries, _ = parse_history_entries(data, indexed_offset)
         
-        # Check if history.txt is in the index
-        history_docs = [doc for doc in self.documents if doc['filepath'] == str(history_file)]
+        if not entries:
+            print("history.txt is up to date in the index")
+            return
         
-        if history_docs:
-            # Get the timestamp of the indexed version
-            indexed_timestamp = history_docs[0].get('file_mtime', 0)
-            
-            if current_mtime > indexed_timestamp:
-                print(f"history.txt has been updated, reindexing...")
-                # Remove old history.txt chunks from index
-                await self._remove_document_from_index(str(history_file))
-                # Add updated version
-                await self._add_documents([history_file], file_mtime=current_mtime)
-            else:
-                print("history.txt is up to date in the index")
-        else:
-            # History file not in index, add it
-            print("Adding history.txt to index for the first time")
-            await self._add_documents([history_file], file_mtime=current_mtime)
+        # Each conversation entry is its own chunk unless it is too long
+        chunks = []
+        byte_ranges = []
+        chunker = self._new_chunker()
+        for start, end, text in entries:
+            for chunk in chunker.chunk(text):
+                chunks.append(chunk)
+                byte_ranges.append((start, end))
+        
+        print(f"Indexing {len(entries)} new history.txt entries ({len(chunks)} chunks)")
+        await self._run_in_executor(
+            self._index_chunks, history_file, chunks, current_mtime,
+            byte_ranges=byte_ranges, first_chunk_index=indexed_chunks
+        )
+        self.progress['chunks_embedded'] += len(chunks)
+        await self._run_in_executor(self._commit_additions)
+    
+    def _history_prefix_intact(self, history_file: Path, offset: int) -> bool:
+        """Check that the already indexed part of history.txt is still in place."""
+        if offset == 0:
+            return True
+        if history_file.stat().st_size < offset:
+            return False
+        # Indexed regions always end right after an entry's closing separator
+        marker = HISTORY_SEPARATOR.encode('utf-8')
+        with open(history_file, 'rb') as f:
+            f.seek(max(0, offset - len(marker) - 4))
+            tail = f.read(min(offset, len(marker) + 4))
+        return marker in tail
+    
+    def _read_bytes_from(self, path: Path, offset: int) -> bytes:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            return f.read()
     
     async def _remove_document_from_index(self, filepath: str):
         """
         Remove all chunks of a document from the index.
         
-        Performance Note: FAISS IndexFlatL2 doesn't support removing individual vectors,
-        so we must rebuild the entire index. For large indexes (>10k chunks), this could
-        take several seconds. This is acceptable for history.txt updates but may need
-        optimization for bulk operations (e.g., use IndexIDMap for deletion support).
+        Chunks are deleted by their stable IDs, so the vectors of the remaining
+        documents are left untouched and nothing has to be re-encoded.
         """
-        # Find indices of chunks to remove
-        indices_to_keep = []
-        docs_to_keep = []
-        
-        for i, doc in enumerate(self.documents):
-            if doc['filepath'] != filepath:
-                indices_to_keep.append(i)
-                docs_to_keep.append(doc)
-        
-        if len(indices_to_keep) == len(self.documents):
-            print(f"No chunks found for {filepath}")
+        await self._run_in_executor(self._remove_chunks, filepath)
+    
+    def _remove_chunks(self, filepath: str):
+        with self._lock:
+            ids_to_remove = self.metadata.ids[self.metadata.rows_for_file(filepath)]
+            
+            if not len(ids_to_remove):
+                print(f"No chunks found for {filepath}")
+                return
+            
+            self._remove_chunk_ids(ids_to_remove)
+            self.checkpointer.mark_dirty()
+    
+    def _remove_chunk_ids(self, ids_to_remove: List[int]):
+        """Drop chunks by ID from their shards, the embeddings and metadata."""
+        with self._lock:
+            rows = self.metadata.rows_for_ids(ids_to_remove)
+            if not len(rows):
+                return
+            removed = self.metadata.ids[rows].copy()
+            by_shard = self._chunk_ids_by_shard(rows)
+            
+            print(f"Removing {len(rows)} chunks from index")
+            self.wal.append('remove', chunk_ids=removed.tolist())
+            for row, chunk_id in zip(rows, removed):
+                self.lexical.remove(int(chunk_id), self.metadata.text(row))
+            self.embeddings.delete_rows(rows)
+            self.metadata.delete_rows(rows)
+            
+            for name, chunk_ids in by_shard.items():
+                self._remove_from_shard(name, chunk_ids)
+    
+    def _remove_from_shard(self, name: str, chunk_ids: np.ndarray):
+        shard = self._legacy_shard or self.shards.get(name)
+        if shard is None:
             return
-        
-        # Rebuild index with remaining documents
-        if self.index and self.index.ntotal > 0:
-            # Extract embeddings for documents to keep
-            if indices_to_keep:
-                print(f"Removing {len(self.documents) - len(indices_to_keep)} chunks from index")
-                # We need to regenerate embeddings for kept documents
-                # This is a limitation of FAISS - we can't remove individual vectors
-                chunks_to_keep = [doc['chunk'] for doc in docs_to_keep]
-                if chunks_to_keep:
-                    embeddings = self.model.encode(chunks_to_keep)
-                    self.index = faiss.IndexFlatL2(self.dimension)
-                    self.index.add(np.array(embeddings).astype('float32'))
-            else:
-                # No documents to keep, reset index
-                self.index = faiss.IndexFlatL2(self.dimension)
-        
-        self.documents = docs_to_keep
-        self._save_index()
+        needs_rebuild = shard.remove(chunk_ids)
+        if shard is self._legacy_shard or name in self._stale_shards:
+            return
+        if shard.live_count <= 0:
+            # e.g. the last note of a deleted folder; the file goes at the next checkpoint
+            del self.shards[name]
+            self._dropped_shards.add(name)
+        elif needs_rebuild:
+            # Too much dead weight in the graph, rebuild from stored vectors
+            self.rebuild_shard(name)
     
-    async def _scan_for_new_files(self) -> List[Path]:
-        """Scan data directory for new files."""
-        supported_extensions = {'.pdf', '.txt', '.md', '.markdown', '.docx'}
-        all_files = []
-        
-        for ext in supported_extensions:
-            all_files.extend(self.data_dir.glob(f"*{ext}"))
+    def _is_managed_file(self, path: Path) -> bool:
+        """history.txt and note files are indexed by their own code paths."""
+        if path == self.data_dir / "history.txt":
+            return True
+        return path.parent == self.data_dir and path.name.startswith("note_") and path.suffix == ".txt"
+    
+    def _plan_data_sync(self, paths: Optional[List[Path]] = None) -> Tuple[List[Path], List[Path], List[Path]]:
+        """
+        Compare data files with the index: ``(new, changed, deleted)``.
         
-        # Filter out already indexed files and history.txt (handled separately)
-        indexed_files = {doc['filepath'] for doc in self.documents}
-        history_file = str(self.data_dir / "history.txt")
-        new_files = [f for f in all_files if str(f) not in indexed_files and str(f) != history_file]
+        Without ``paths`` the whole data directory is scanned. A file whose
+        mtime moved is hashed and only counts as changed when its content
+        hash differs from the indexed one, so touching or re-saving a file
+        does not re-embed it. Files chunked with another strategy are not
+        changed either: they move to the configured chunker the next time
+        their content changes, so switching strategies never re-embeds the
+        whole corpus at startup.
+        """
+        if paths is None:
+            paths = [path for path in self.data_dir.iterdir() if path.suffix.lower() in SUPPORTED_EXTENSIONS]
+            with self._lock:
+                indexed = self.metadata.indexed_files()
+            paths += [Path(filepath) for filepath in indexed if Path(filepath).parent == self.data_dir]
+        else:
+            with self._lock:
+                indexed = self.metadata.indexed_files()
         
-        return new_files
+        new_files, changed_files, deleted_files = [], [], []
+        for path in sorted(set(paths)):
+            if self._is_managed_file(path) or path.suffix.lower() not in SUPPORTED_EXTENSIONS:
+                continue
+            if not path.is_file():
+                if str(path) in indexed:
+                    deleted_files.append(path)
+                continue
+            if str(path) not in indexed:
+                new_files.append(path)
+                continue
+            
+            with self._lock:
+                record = self.metadata.file_info(str(path)) or {}
+            mtime = path.stat().st_mtime
+            stored_hash = record.get('content_hash')
+            if record.get('file_mtime') == mtime and stored_hash:
+                continue
+            content_hash = file_content_hash(path)
+            if content_hash == stored_hash or (stored_hash is None and record.get('file_mtime') == mtime):
+                # Same content (or indexed before hashes were stored)
+                self._record_file_state(path, {'file_mtime': mtime, 'content_hash': content_hash})
+            else:
+                changed_files.append(path)
+        return new_files, changed_files, deleted_files
+    
+    def _new_chunker(self):
+        """Chunker for the configured strategy, sized with the model's tokenizer."""
+        return create_chunker(
+            settings.rag_chunking_strategy,
+            self.model,
+            settings.rag_chunk_max_tokens,
+            settings.rag_chunk_overlap_tokens
+        )
+    
+    def _record_file_state(self, path: Path, attributes: Dict):
+        with self._lock:
+            self.wal.append('update_file', filepath=str(path), file_attributes=attributes)
+            self._update_file_record(str(path), attributes)
+            self.checkpointer.mark_dirty()
+    
+    async def _apply_data_sync(self, new_files: List[Path], changed_files: List[Path], deleted_files: List[Path]):
+        for path in deleted_files:
+            print(f"{path.name} was deleted, removing it from the index")
+            await self._remove_document_from_index(str(path))
+        if changed_files:
+            print(f"Found {len(changed_files)} changed files to re-index")
+        if new_files:
+            print(f"Found {len(new_files)} new files to index")
+        if changed_files or new_files:
+            await self._add_documents(changed_files + new_files)
+    
+    async def _sync_data_files(self, paths: Optional[List[Path]] = None):
+        """Bring the given data files (or all of data/) in step with the index."""
+        async with self._sync_lock:
+            plan = await self._run_in_executor(self._plan_data_sync, paths)
+            await self._apply_data_sync(*plan)
     
     async def _add_documents(self, files: List[Path], file_mtime: float = None):
-        """Process and add documents to FAISS index."""
-        for file_path in files:
+        """
+        Process and add documents to FAISS index.
+        
+        A file that is already indexed is replaced: its new chunks are added
+        first and the old ones removed afterwards, so searches keep finding
+        the document while it is re-embedded. Text that did not change is
+        served from the embedding cache instead of the model.
+        
+        Text streams in from the extraction pool a page range at a time and
+        is chunked and embedded in batches as it arrives, so the first
+        chunks of a long PDF are searchable before the rest is parsed, and
+        the next files are parsed while the current one is embedded.
+        """
+        async for file_path, segments in iter_extracted_documents(files):
             try:
                 print(f"Processing: {file_path.name}")
-                text = await extract_text_from_file(str(file_path))
-                
-                if not text:
-                    print(f"No text extracted from {file_path.name}")
-                    continue
-                
-                # Chunk the text
-                chunks = chunk_text(text, chunk_size=800, overlap=100)
-                
-                if not chunks:
-                    continue
+                with self._lock:
+                    old_ids = self.metadata.ids[self.metadata.rows_for_file(str(file_path))].copy()
+                    record = self.metadata.file_info(str(file_path)) or {}
+                content_hash = await self._run_in_executor(file_content_hash, file_path)
                 
-                # Generate embeddings
-                embeddings = self.model.encode(chunks)
+                # Get file modification time if not provided (using Path for consistency)
+                mtime = file_mtime
+                if mtime is None:
+                    mtime = file_path.stat().st_mtime if file_path.exists() else 0
                 
-                # Add to FAISS index
-                if self.index is None:
-                    self.index = faiss.IndexFlatL2(self.dimension)
+                # Batches keep the record's previous mtime and the new hash is
+                # only stored once the whole file is in, so a file interrupted
+                # part way through is re-indexed by the next scan
+                partial_mtime = record.get('file_mtime', 0)
+                chunker = self._new_chunker()
+                chunks: List[str] = []
+                chunk_count = 0
                 
-                self.index.add(np.array(embeddings).astype('float32'))
+                async def flush(final: bool = False):
+                    nonlocal chunks, chunk_count
+                    if chunks and (final or len(chunks) >= settings.rag_ingest_batch_chunks):
+                        # Embed and index off the event loop
+                        await self._run_in_executor(
+                            partial(self._index_chunks, file_path, chunks, partial_mtime, first_chunk_index=chunk_count)
+                        )
+                        self.progress['chunks_embedded'] += len(chunks)
+                        chunk_count += len(chunks)
+                        chunks = []
                 
-                # Get file modification time if not provided (using Path for consistency)
-                if file_mtime is None:
-                    file_mtime = file_path.stat().st_mtime if file_path.exists() else 0
+                async for segment in segments:
+                    chunks.extend(chunker.feed(segment))
+                    await flush()
+                chunks.extend(chunker.close())
+                await flush(final=True)
                 
-                # Store metadata
-                for i, chunk in enumerate(chunks):
-                    self.documents.append({
-                        'filepath': str(file_path),
-                        'filename': file_path.name,
-                        'chunk': chunk,
-                        'chunk_index': i,
-                        'timestamp': datetime.utcnow().isoformat(),
-                        'file_mtime': file_mtime
-                    })
+                if len(old_ids):
+                    await self._run_in_executor(self._remove_chunk_ids, old_ids)
+                if not chunk_count:
+                    print(f"No text extracted from {file_path.name}")
+                    continue
+                await self._run_in_executor(
+                    self._record_file_state,
+                    file_path,
+                    {'file_mtime': mtime, 'content_hash': content_hash, 'chunking': chunker.signature}
+                )
                 
-                print(f"Added {len(chunks)} chunks from {file_path.name}")
+                print(f"Added {chunk_count} chunks from {file_path.name}")
                 
             except Exception as e:
                 print(f"Error processing {file_path.name}: {e}")
+            finally:
+                if not self.ready:
+                    # Only startup indexing is tracked; later syncs are not part of files_total
+                    self.progress['files_done'] += 1
         
-        # Save index after adding documents
-        self._save_index()
+        await self._run_in_executor(self._commit_additions)
     
-    async def add_note_to_index(self, title: str, content: str, note_id: str):
-        """Add a single note to the index."""
-        try:
-            # Save note as text file
-            clean_title = title.replace(' ', '_').replace('/', '_')
-            timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
-            filename = f"{clean_title}_{timestamp}.txt"
-            filepath = self.data_dir / filename
+    async def add_documents(self, files: List[Path]):
+        """Async API: index new or changed files without blocking the event loop."""
+        if self._forward_to_writer('add_documents', files=[str(path) for path in files]):
+            return
+        await self._sync_data_files(files)
+    
+    def _index_chunks(self, file_path: Path, chunks: List[str], file_mtime: float,
+                      file_attributes: Optional[Dict] = None, chunk_indexes: Optional[List[int]] = None,
+                      byte_ranges: Optional[List[Tuple[int, int]]] = None, first_chunk_index: int = 0):
+        """Embed chunks and add them to the index under fresh chunk IDs."""
+        # Generate embeddings (cached chunks skip the model)
+        embeddings = self._encode_chunks(chunks)
+        
+        with self._lock:
+            chunk_ids = np.arange(self.next_chunk_id, self.next_chunk_id + len(chunks), dtype='int64')
+            self.next_chunk_id += len(chunks)
+            if chunk_indexes is None:
+                chunk_indexes = list(range(first_chunk_index, first_chunk_index + len(chunks)))
+            if byte_ranges is None:
+                byte_ranges = [(-1, -1)] * len(chunks)
+            file_attributes = {'file_mtime': file_mtime, **(file_attributes or {})}
+            indexed_at = time.time()
+            
+            self.wal.append(
+                'add',
+                filepath=str(file_path),
+                file_attributes=file_attributes,
+                chunk_ids=chunk_ids.tolist(),
+                chunks=chunks,
+                chunk_indexes=list(chunk_indexes),
+                byte_ranges=[list(byte_range) for byte_range in byte_ranges],
+                indexed_at=indexed_at,
+                vectors=encode_vectors(embeddings)
+            )
+            file_idx = self._update_file_record(str(file_path), file_attributes)
+            self._get_shard(self._shard_name(file_idx)).add(embeddings, chunk_ids)
+            self.embeddings.append(embeddings)
             
-            # Save content to file
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(content)
+            # Store metadata
+            self.metadata.append(file_idx, chunk_ids, chunks, chunk_indexes, byte_ranges, indexed_at)
+            self.lexical.add_many(chunk_ids, chunks)
+    
+    def _commit_additions(self):
+        """Promote shards that have grown large enough and schedule a checkpoint."""
+        with self._lock:
+            # Promote to an ANN index once a shard has grown large enough
+            self._maybe_promote_index()
+            self.checkpointer.mark_dirty()
+    
+    def _encode_chunks(self, chunks: List[str]) -> np.ndarray:
+        """Embed chunks, reusing cached vectors for text that was seen before."""
+        cached = self.embedding_cache.get_many(chunks)
+        
+        missing = []
+        seen = set()
+        for chunk in chunks:
+            key = self.embedding_cache.key(chunk)
+            if key not in cached and key not in seen:
+                seen.add(key)
+                missing.append(chunk)
+        
+        if missing:
+            vectors = np.array(self.model.encode(missing)).astype('float32')
+            self.embedding_cache.put_many(missing, vectors)
+            for chunk, vector in zip(missing, vectors):
+                cached[self.embedding_cache.key(chunk)] = vector
+        
+        if len(missing) < len(chunks):
+            print(f"Embedding cache hit for {len(chunks) - len(missing)}/{len(chunks)} chunks")
+        
+        return np.vstack([cached[self.embedding_cache.key(chunk)] for chunk in chunks]).astype('float32')
+    
+    async def add_note_to_index(self, title: str, content: str, note_id: str, folder_id: Optional[str] = None):
+        """
+        Add or update a note in the index, keyed by its note ID.
+        
+        The note is kept in a single data/note_{note_id}.txt file that is
+        overwritten on update. Chunks whose text is unchanged keep their
+        vectors, chunks that disappeared are evicted and only new text is
+        embedded.
+        """
+        if self._forward_to_writer('add_note', title=title, content=content, note_id=note_id, folder_id=folder_id):
+            return
+        if self._defer_note(note_id, {'title': title, 'content': content, 'note_id': note_id, 'folder_id': folder_id}):
+            return
+        try:
+            filepath = self._note_path(note_id)
+            chunks = self._new_chunker().chunk(content)
             
-            # Add to index
-            await self._add_documents([filepath])
+            # The diff against the indexed chunks is only valid until the
+            # next save of the same note
+            async with self._note_lock(note_id):
+                await self._run_in_executor(self._write_note_file, filepath, content)
+                kept, added, removed = await self._run_in_executor(
+                    self._upsert_note_chunks, note_id, title, folder_id, filepath, chunks
+                )
+            self.progress['chunks_embedded'] += added
+            await self._run_in_executor(self._commit_additions)
             
-            print(f"Note '{title}' added to RAG index")
+            print(f"Note '{title}' indexed ({kept} chunks unchanged, {added} embedded, {removed} removed)")
             
         except Exception as e:
             print(f"Error adding note to index: {e}")
     
-    def search(self, query: str, k: int = 3) -> List[Dict]:
-        """Search for relevant documents."""
-        if self.index is None or self.index.ntotal == 0:
+    async def remove_note_from_index(self, note_id: str):
+        """Evict a deleted note's chunks and its data file."""
+        if self._forward_to_writer('remove_note', note_id=note_id):
+            return
+        if self._defer_note(note_id, None):
+            return
+        try:
+            filepath = self._note_path(note_id)
+            async with self._note_lock(note_id):
+                await self._run_in_executor(self._remove_note, note_id, filepath)
+            print(f"Note {note_id} removed from RAG index")
+        except Exception as e:
+            print(f"Error removing note from index: {e}")
+    
+    def _defer_note(self, note_id: str, note: Optional[Dict]) -> bool:
+        """Before the system is ready, remember the latest change to a note instead of applying it."""
+        if self.ready:
+            return False
+        self._deferred_notes[note_id] = note
+        print(f"RAG system is still indexing, note {note_id} will be updated once it is ready")
+        return True
+    
+    @asynccontextmanager
+    async def _note_lock(self, note_id: str):
+        entry = self._note_locks.setdefault(note_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._note_locks[note_id]
+    
+    async def _apply_deferred_notes(self):
+        deferred, self._deferred_notes = self._deferred_notes, {}
+        if deferred:
+            print(f"Applying {len(deferred)} note changes made during startup indexing")
+        for note_id, note in deferred.items():
+            if note is None:
+                await self.remove_note_from_index(note_id)
+            else:
+                await self.add_note_to_index(**note)
+    
+    def _note_path(self, note_id: str) -> Path:
+        return self.data_dir / f"note_{note_id}.txt"
+    
+    def _write_note_file(self, filepath: Path, content: str):
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(content)
+    
+    def _upsert_note_chunks(self, note_id: str, title: str, folder_id: Optional[str],
+                            filepath: Path, chunks: List[str]) -> Tuple[int, int, int]:
+        """Diff a note's new chunks against the indexed ones by text hash."""
+        attributes = {'filename': title, 'note_id': note_id, 'folder_id': folder_id}
+        
+        with self._lock:
+            rows = self.metadata.rows_for_note(note_id)
+            existing: Dict[int, List[int]] = {}
+            for row in rows:
+                existing.setdefault(int(self.metadata.columns['text_hash'][row]), []).append(int(self.metadata.ids[row]))
+            stale_ids = {int(chunk_id) for chunk_id in self.metadata.ids[rows]}
+        
+        kept = []
+        new_chunks = []
+        new_indexes = []
+        for i, chunk in enumerate(chunks):
+            matches = existing.get(text_hash(chunk))
+            if matches:
+                chunk_id = matches.pop()
+                stale_ids.discard(chunk_id)
+                kept.append((chunk_id, i))
+            else:
+                new_chunks.append(chunk)
+                new_indexes.append(i)
+        
+        # Only changed text goes through the model
+        mtime = filepath.stat().st_mtime
+        if new_chunks:
+            self._index_chunks(filepath, new_chunks, mtime, file_attributes=attributes, chunk_indexes=new_indexes)
+        
+        with self._lock:
+            attributes['file_mtime'] = mtime
+            self.wal.append('update_file', filepath=str(filepath), file_attributes=attributes)
+            self._update_file_record(str(filepath), attributes)
+            if kept:
+                self.wal.append(
+                    'set_chunk_indexes',
+                    chunk_ids=[chunk_id for chunk_id, _ in kept],
+                    chunk_indexes=[i for _, i in kept]
+                )
+                kept_rows = self.metadata.rows_for_ids([chunk_id for chunk_id, _ in kept])
+                self.metadata.set_chunk_indexes(kept_rows, [i for _, i in kept])
+            self._remove_chunk_ids(list(stale_ids))
+        
+        return len(kept), len(new_chunks), len(stale_ids)
+    
+    def _remove_note(self, note_id: str, filepath: Path):
+        with self._lock:
+            ids_to_remove = self.metadata.ids[self.metadata.rows_for_note(note_id)]
+            if len(ids_to_remove):
+                self._remove_chunk_ids(ids_to_remove)
+                self.checkpointer.mark_dirty()
+        if filepath.exists():
+            filepath.unlink()
+    
+    def _shard_name(self, file_idx: int) -> str:
+        return shard_for_record(self.metadata.files[file_idx], str(self.data_dir / "history.txt"))
+    
+    def _get_shard(self, name: str) -> VectorShard:
+        """The shard new vectors of ``name`` go to, created on first use."""
+        if self._legacy_shard is not None:
+            return self._legacy_shard
+        if name not in self.shards:
+            self.shards[name] = VectorShard(name, self.shard_dir, self.dimension)
+            self._dropped_shards.discard(name)
+        return self.shards[name]
+    
+    def _shard_rows(self) -> Dict[str, np.ndarray]:
+        """Metadata rows grouped by the shard that holds their vectors."""
+        names = [self._shard_name(i) for i in range(len(self.metadata.files))]
+        rows: Dict[str, List[np.ndarray]] = {}
+        file_idx = self.metadata.columns['file_idx']
+        for i in np.unique(file_idx):
+            rows.setdefault(names[i], []).append(np.flatnonzero(file_idx == i))
+        return {name: np.sort(np.concatenate(parts)) for name, parts in rows.items()}
+    
+    def _chunk_ids_by_shard(self, rows: np.ndarray) -> Dict[str, np.ndarray]:
+        names = np.array([self._shard_name(int(i)) for i in self.metadata.columns['file_idx'][rows]], dtype=object)
+        return {name: self.metadata.ids[rows[names == name]] for name in set(names)}
+    
+    def _vector_count(self) -> int:
+        return sum(shard.live_count for shard in self.shards.values())
+    
+    def _update_file_record(self, filepath: str, attributes: Dict) -> int:
+        """
+        Create or update a file record, moving its vectors if the shard changed.
+        
+        A note moved to another folder keeps its chunk IDs and vectors; they
+        are only carried over from the old folder's shard to the new one.
+        """
+        file_idx = self.metadata.file_index(filepath)
+        old_shard = self._shard_name(file_idx) if file_idx is not None else None
+        file_idx = self.metadata.upsert_file(filepath, **attributes)
+        new_shard = self._shard_name(file_idx)
+        if old_shard is None or old_shard == new_shard or self._legacy_shard is not None:
+            return file_idx
+        
+        rows = np.flatnonzero(self.metadata.columns['file_idx'] == file_idx)
+        if len(rows) == 0:
+            return file_idx
+        chunk_ids = self.metadata.ids[rows]
+        if old_shard in self._stale_shards or old_shard not in self.shards:
+            self._stale_shards.add(new_shard)
+            return file_idx
+        if len(self.embeddings) == len(self.metadata):
+            vectors = self.embeddings.get_rows(rows)
+        else:
+            vectors = self.shards[old_shard].reconstruct(chunk_ids)
+        self._get_shard(new_shard).add_missing(vectors, chunk_ids)
+        self._remove_from_shard(old_shard, chunk_ids)
+        return file_idx
+    
+    def _encode_queries(self, queries: List[str]) -> np.ndarray:
+        return np.array(self.model.encode(queries)).astype('float32').reshape(len(queries), self.dimension)
+    
+    async def search_async(self, query: str, k: int = 3, mode: Optional[str] = None,
+                           filters: Optional[Dict] = None) -> List[Dict]:
+        """Async API: batch the query encode with concurrent callers, search on the RAG executor."""
+        if self._vector_count() == 0:
             return []
         
+        mode = self._search_mode(mode)
+        query_embedding = None
+        if mode != "lexical":
+            try:
+                query_embedding = await self.query_batcher.encode(query)
+            except Exception as e:
+                print(f"Error encoding query: {e}")
+                return []
+        
+        return await self._run_in_executor(self._search, query, query_embedding, k, mode, filters)
+    
+    def search(self, query: str, k: int = 3, mode: Optional[str] = None,
+               filters: Optional[Dict] = None) -> List[Dict]:
+        """
+        Search for relevant documents.
+        
+        ``mode`` is "dense" (embedding similarity), "lexical" (BM25) or
+        "hybrid" (reciprocal-rank fusion of both), defaulting to
+        ``rag_search_mode``.
+        
+        ``filters`` restricts the search to matching chunks; supported keys
+        are ``folder_id``, ``source_kind`` (note, document or history) and
+        ``modified_after`` / ``modified_before`` (file mtime, Unix seconds).
+        """
+        if self._vector_count() == 0:
+            return []
+        
+        mode = self._search_mode(mode)
+        query_embedding = None
+        if mode != "lexical":
+            try:
+                # Encode query
+                query_embedding = self._encode_queries([query])[0]
+            except Exception as e:
+                print(f"Error encoding query: {e}")
+                return []
+        
+        return self._search(query, query_embedding, k, mode, filters)
+    
+    def _search_mode(self, mode: Optional[str]) -> str:
+        mode = mode or settings.rag_search_mode
+        if mode not in SEARCH_MODES:
+            print(f"Unknown search mode '{mode}', using hybrid")
+            return "hybrid"
+        return mode
+    
+    def _search(self, query: str, query_embedding: Optional[np.ndarray], k: int, mode: str,
+                filters: Optional[Dict] = None) -> List[Dict]:
+        """Rank chunks for an already encoded query and materialize the top k."""
         try:
-            # Encode query
-            query_embedding = self.model.encode([query])
-            
-            # Search
-            distances, indices = self.index.search(
-                np.array(query_embedding).astype('float32'), 
-                min(k, self.index.ntotal)
-            )
-            
-            # Format results
-            results = []
-            for i, idx in enumerate(indices[0]):
-                if idx < len(self.documents):
-                    doc = self.documents[idx].copy()
-                    doc['similarity'] = float(1 / (1 + distances[0][i]))  # Convert distance to similarity
-                    results.append(doc)
-            
-            return results
+            with self._lock.read():
+                if self._vector_count() == 0:
+                    return []
+                
+                allowed_ids = self._filtered_chunk_ids(filters)
+                if allowed_ids is not None and len(allowed_ids) == 0:
+                    return []
+                shard_names = self._shards_for_filters(filters)
+                
+                # Over-fetch so the diversification stage has something to choose from
+                pool = k * max(1, settings.rag_mmr_candidate_multiplier)
+                if mode == "dense":
+                    hits = [(chunk_id, 1 / (1 + distance))
+                            for chunk_id, distance in self._dense_search(query_embedding, pool, allowed_ids, shard_names)]
+                elif mode == "lexical":
+                    hits = self._lexical_search(query, pool, allowed_ids)
+                else:
+                    # Fuse a deeper candidate list from each retriever
+                    candidates = max(pool, settings.rag_hybrid_candidates)
+                    dense = self._dense_search(query_embedding, candidates, allowed_ids, shard_names)
+                    lexical = self._lexical_search(query, candidates, allowed_ids)
+                    hits = reciprocal_rank_fusion(
+                        [[chunk_id for chunk_id, _ in dense], [chunk_id for chunk_id, _ in lexical]],
+                        pool,
+                        settings.rag_rrf_k
+                    )
+                
+                return self._format_results(self._diversify(hits, k), query_embedding)
             
         except Exception as e:
             print(f"Error searching index: {e}")
             return []
     
+    def _diversify(self, hits: List[Tuple[int, float]], k: int) -> List[Tuple[int, float]]:
+        """
+        Re-rank candidates with MMR and collapse near-duplicates.
+        
+        Works on the candidates' stored vectors, so overlapping chunks of one
+        file or stale copies of a note do not fill the prompt with the same
+        text several times.
+        """
+        hits = [(chunk_id, score) for chunk_id, score in hits if self.metadata.row_of(chunk_id) is not None]
+        if len(hits) <= 1:
+            return hits[:k]
+        
+        rows = [self.metadata.row_of(chunk_id) for chunk_id, _ in hits]
+        scores = np.array([score for _, score in hits], dtype='float32')
+        relevance = scores / scores.max() if scores.max() > 0 else np.ones_like(scores)
+        picks = mmr_select(
+            relevance,
+            self.embeddings.get_rows(rows),
+            k,
+            settings.rag_mmr_lambda,
+            settings.rag_duplicate_threshold
+        )
+        return [hits[i] for i in picks]
+    
+    def _filtered_chunk_ids(self, filters: Optional[Dict]) -> Optional[np.ndarray]:
+        """
+        Chunk IDs matching the search filters, or None when nothing is filtered.
+        
+        Predicates are evaluated once per file record and broadcast to a row
+        mask through the file index column, so no chunk text is touched.
+        """
+        filters = {key: value for key, value in (filters or {}).items() if value is not None}
+        if not filters:
+            return None
+        
+        unknown = set(filters) - {'folder_id', 'source_kind', 'modified_after', 'modified_before'}
+        if unknown:
+            raise ValueError(f"Unknown search filters: {', '.join(sorted(unknown))}")
+        if filters.get('source_kind', 'note') not in SOURCE_KINDS:
+            raise ValueError(f"Unknown source kind: {filters['source_kind']}")
+        
+        history_file = str(self.data_dir / "history.txt")
+        
+        def matches(record: Dict) -> bool:
+            if 'folder_id' in filters and record.get('folder_id') != filters['folder_id']:
+                return False
+            if 'source_kind' in filters:
+                if record.get('note_id') is not None:
+                    kind = "note"
+                elif record['filepath'] == history_file:
+                    kind = "history"
+                else:
+                    kind = "document"
+                if kind != filters['source_kind']:
+                    return False
+            mtime = record.get('file_mtime', 0)
+            if 'modified_after' in filters and mtime < filters['modified_after']:
+                return False
+            if 'modified_before' in filters and mtime > filters['modified_before']:
+                return False
+            return True
+        
+        return self.metadata.ids[self.metadata.rows_matching(matches)]
+    
+    def _shards_for_filters(self, filters: Optional[Dict]) -> List[str]:
+        """Shards that can hold chunks matching the folder / source kind filters."""
+        names = set(self.shards)
+        filters = filters or {}
+        if filters.get('folder_id') is not None:
+            names &= {f"folder-{filters['folder_id']}"}
+        kind = filters.get('source_kind')
+        if kind == "note":
+            names = {name for name in names if name == "notes" or name.startswith("folder-")}
+        elif kind == "document":
+            names &= {"documents"}
+        elif kind == "history":
+            names &= {"history"}
+        return sorted(names)
+    
+    def _lexical_search(self, query: str, k: int, allowed_ids: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        if allowed_ids is None:
+            return self.lexical.search(query, k)
+        allowed = set(allowed_ids.tolist())
+        return self.lexical.search(query, k, allowed.__contains__)
+    
+    def _dense_search(self, query_embedding: np.ndarray, k: int,
+                      allowed_ids: Optional[np.ndarray] = None,
+                      shard_names: Optional[List[str]] = None) -> List[Tuple[int, float]]:
+        """
+        Nearest chunk IDs with their L2 distances.
+        
+        The query fans out to the relevant shards in parallel threads (FAISS
+        releases the GIL) and the per-shard top-k lists are merged by
+        distance. Tombstoned chunks are skipped and ``allowed_ids`` (metadata
+        filters) restricts each scan through an ID selector inside the index.
+        Small filtered subsets are scanned exactly from the stored vectors
+        instead, since an ANN probe may not reach any of them.
+        
+        Shards holding quantized codes return approximate distances, so a
+        ``rag_rerank_multiplier`` times larger candidate set is fetched and
+        re-ranked by exact distance against the memory-mapped embeddings.
+        """
+        if allowed_ids is not None and len(allowed_ids) <= settings.rag_filter_exact_search_max:
+            vectors = self.embeddings.get_rows(self.metadata.rows_for_ids(allowed_ids))
+            distances = ((vectors - query_embedding.reshape(1, -1)) ** 2).sum(axis=1)
+            order = np.argsort(distances)[:k]
+            return [(int(allowed_ids[i]), float(distances[i])) for i in order]
+        
+        if shard_names is None:
+            shard_names = sorted(self.shards)
+        shards = [self.shards[name] for name in shard_names if name in self.shards]
+        rerank = any(vector_index.is_lossy(shard.index) for shard in shards)
+        candidates = k * max(1, settings.rag_rerank_multiplier) if rerank else k
+        if len(shards) == 1:
+            hits = shards[0].search(query_embedding, candidates, allowed_ids)
+        else:
+            futures = [self._shard_executor.submit(shard.search, query_embedding, candidates, allowed_ids) for shard in shards]
+            hits = [hit for future in futures for hit in future.result()]
+        
+        if rerank and hits:
+            rows = self.metadata.rows_for_ids(chunk_id for chunk_id, _ in hits)
+            vectors = self.embeddings.get_rows(rows)
+            distances = ((vectors - query_embedding.reshape(1, -1)) ** 2).sum(axis=1)
+            hits = list(zip(self.metadata.ids[rows].tolist(), distances.tolist()))
+        return sorted(hits, key=lambda hit: hit[1])[:k]
+    
+    def _format_results(self, hits: List[Tuple[int, float]], query_embedding: Optional[np.ndarray]) -> List[Dict]:
+        """
+        Turn ranked ``(chunk_id, score)`` hits into result dicts.
+        
+        Chunk text is only read from disk for these hits. ``similarity`` is
+        always the embedding similarity, recomputed from the stored vectors
+        so lexical and fused hits report it too.
+        """
+        rows = [self.metadata.row_of(chunk_id) for chunk_id, _ in hits]
+        hits = [(hit, row) for hit, row in zip(hits, rows) if row is not None]
+        if not hits:
+            return []
+        
+        distances = None
+        if query_embedding is not None:
+            vectors = self.embeddings.get_rows([row for _, row in hits])
+            distances = ((vectors - query_embedding.reshape(1, -1)) ** 2).sum(axis=1)
+        
+        results = []
+        for i, ((_, score), row) in enumerate(hits):
+            doc = self.metadata.get(row)
+            doc['score'] = score
+            if distances is not None:
+                doc['similarity'] = float(1 / (1 + distances[i]))  # Convert distance to similarity
+            else:
+                doc['similarity'] = None
+            results.append(doc)
+        return results
+    
+    def get_metrics(self) -> Dict:
+        """Runtime metrics for the RAG system."""
+        return {
+            'chunks': len(self.metadata),
+            'shards': {
+                name: {'backend': shard.backend, 'codec': shard.codec, 'vectors': shard.live_count}
+                for name, shard in sorted(self.shards.items())
+            },
+            'lexical_terms': self.lexical.term_count,
+            'query_batching': self.query_batcher.metrics(),
+            'persistence': {
+                'pending_changes': self.checkpointer.pending,
+                'checkpoints': self.checkpointer.checkpoints,
+                'wal_seq': self.wal.last_seq
+            },
+            'worker': {'role': self.role, 'snapshot': self.snapshot_version}
+        }
+    
     def _save_index(self):
         """Save FAISS index and metadata to disk."""
         try:
-            if self.index is not None:
-                faiss.write_index(self.index, str(self.index_path))
-                
-            with open(self.metadata_path, 'wb') as f:
-                pickle.dump(self.documents, f)
-                
-            print("Index saved successfully")
-            
+            self._write_checkpoint()
         except Exception as e:
             print(f"Error saving index: {e}")
     
+    def _write_checkpoint(self):
+        """
+        Atomically write changed shards and the metadata, then truncate the WAL.
+        
+        Each file is written to a temporary path and renamed into place, so a
+        crash mid-write leaves the previous checkpoint intact. Shards that did
+        not change since the last checkpoint are not rewritten. If the process
+        dies between the renames, replaying the WAL on startup is idempotent
+        and brings all files back in line.
+        """
+        with self._lock:
+            for shard in self.shards.values():
+                if shard.dirty:
+                    shard.save()
+            
+            self.embeddings.checkpoint(self.wal.last_seq)
+            pruned = self.metadata.prune_files()
+            if pruned:
+                print(f"Dropped {pruned} file records without chunks")
+            self.metadata.checkpoint_seq = self.wal.last_seq
+            self.metadata.save()
+            self.lexical.checkpoint_seq = self.wal.last_seq
+            self.lexical.save()
+            self.wal.reset()
+            
+            for name in self._dropped_shards:
+                (self.shard_dir / f"{name}.index").unlink(missing_ok=True)
+            self._dropped_shards = set()
+            
+            if self.role == "writer":
+                self._publish_snapshot()
+            print("Index saved successfully")
+    
     def _load_index(self):
-        """Load FAISS index and metadata from disk."""
+        """Load the FAISS shards and metadata from disk."""
         try:
-            self.index = faiss.read_index(str(self.index_path))
+            documents = None
+            if self.metadata.exists():
+                self.metadata.load()
+                if not self.lexical.load() or self.lexical.checkpoint_seq != self.metadata.checkpoint_seq:
+                    self._rebuild_lexical_index()
+            else:
+                # Pre-columnar store, chunk dicts pickled in metadata.pkl
+                with open(self.legacy_metadata_path, 'rb') as f:
+                    documents = pickle.load(f)
             
-            with open(self.metadata_path, 'rb') as f:
-                self.documents = pickle.load(f)
-                
-            print("Index loaded successfully")
+            if documents is not None or self.legacy_index_path.exists():
+                # Single faiss.index from before sharding; changes are replayed
+                # into it, then it is split into shards from the stored vectors
+                self._legacy_shard = VectorShard("legacy", self.index_dir, self.dimension)
+                try:
+                    self._legacy_shard.index = faiss.read_index(str(self.legacy_index_path))
+                except Exception as e:
+                    if documents is not None:
+                        raise
+                    print(f"Error reading FAISS index ({e}), rebuilding from stored embeddings")
+                    self._legacy_shard = None
+            else:
+                self._load_shards()
+            
+            if documents is not None:
+                self._migrate_legacy_metadata(documents)
+            else:
+                self._replay_wal()
+            
+            self.next_chunk_id = int(self.metadata.ids.max()) + 1 if len(self.metadata) else 0
+            
+            if len(self.embeddings) != len(self.metadata):
+                self._backfill_embeddings()
+            
+            if self._legacy_shard is not None or self.legacy_index_path.exists():
+                print("Splitting the FAISS index into per-folder shards...")
+                self._legacy_shard = None
+                self._reset_shards()
+                self._stale_shards = set(self._shard_rows())
+            self._drop_empty_shards()
+            # Picks up codec / backend setting changes for the loaded shards
+            recoded = self._maybe_promote_index()
+            if self._stale_shards or self._dropped_shards or recoded:
+                for name in sorted(self._stale_shards):
+                    self.rebuild_shard(name)
+                self._stale_shards = set()
+                self._write_checkpoint()
+            self.legacy_index_path.unlink(missing_ok=True)
+            
+            backends = ", ".join(f"{name}: {shard.backend}" for name, shard in sorted(self.shards.items()))
+            print(f"Index loaded successfully ({len(self.shards)} shards; {backends or 'empty'})")
             
         except Exception as e:
             print(f"Error loading index: {e}")
-            self.index = faiss.IndexFlatL2(self.dimension)
-            self.documents = []
+            self._legacy_shard = None
+            self._stale_shards = set()
+            self._reset_shards()
+            self.metadata.clear()
+            self.lexical.clear()
+            self.next_chunk_id = 0
+            self.embeddings.reset()
+            self.wal.reset()
+    
+    def _reset_shards(self):
+        """Forget every shard; their files are deleted at the next checkpoint."""
+        self._dropped_shards.update(path.stem for path in self.shard_dir.glob("*.index"))
+        self.shards = {}
+    
+    def _load_shards(self):
+        """
+        Load the shard files; shards the metadata needs that are missing or
+        unreadable are marked stale.
+        
+        Shard files the metadata does not know about yet may hold vectors
+        whose metadata is still in the WAL, so they are loaded too and only
+        dropped if they are still empty after the replay.
+        """
+        expected = set(self._shard_rows())
+        on_disk = {path.stem for path in self.shard_dir.glob("*.index")}
+        
+        self.shards = {}
+        self._stale_shards = set()
+        for name in sorted(expected | on_disk):
+            shard = VectorShard(name, self.shard_dir, self.dimension)
+            self.shards[name] = shard
+            try:
+                shard.load(self.metadata.ids)
+                if shard.tombstones:
+                    print(f"{len(shard.tombstones)} deleted chunks pending removal from shard {name}")
+            except Exception as e:
+                if name not in expected:
+                    del self.shards[name]
+                    self._dropped_shards.add(name)
+                    continue
+                print(f"Error reading shard {name} ({e}), rebuilding it from stored embeddings")
+                self._stale_shards.add(name)
+    
+    def _drop_empty_shards(self):
+        for name, shard in list(self.shards.items()):
+            if shard.live_count <= 0 and name not in self._stale_shards:
+                del self.shards[name]
+                self._dropped_shards.add(name)
+    
+    def _replay_wal(self):
+        """Re-apply changes logged after the last checkpoint (i.e. lost in a crash)."""
+        entries = [entry for entry in self.wal.entries()
+                   if entry['op'] != 'checkpoint' and entry['seq'] > self.metadata.checkpoint_seq]
+        self.wal.last_seq = max(self.wal.last_seq, self.metadata.checkpoint_seq)
+        if not entries:
+            return
+        
+        print(f"Replaying {len(entries)} unsaved index changes from the write-ahead log")
+        for entry in entries:
+            self._apply_wal_entry(entry)
+        # Appends to the embedding store were written through before the
+        # crash and its removals re-tombstoned above; if it is out of step
+        # the caller restores it from the index
+        if self._legacy_shard is None and not self._stale_shards:
+            self._save_index()
+    
+    def _apply_wal_entry(self, entry: Dict):
+        op = entry['op']
+        if op == 'add':
+            chunk_ids = np.array(entry['chunk_ids'], dtype='int64')
+            vectors = decode_vectors(entry['vectors'], self.dimension)
+            
+            file_idx = self._update_file_record(entry['filepath'], entry['file_attributes'])
+            name = self._shard_name(file_idx)
+            if name not in self._stale_shards:
+                # The shard may already hold these IDs if the crash came
+                # between writing the shard and the metadata
+                self._get_shard(name).add_missing(vectors, chunk_ids)
+            
+            new = ~np.isin(chunk_ids, self.metadata.ids)
+            if new.any():
+                self.metadata.append(
+                    file_idx,
+                    chunk_ids[new],
+                    [chunk for chunk, keep in zip(entry['chunks'], new) if keep],
+                    np.array(entry['chunk_indexes'])[new],
+                    [tuple(byte_range) for byte_range, keep in zip(entry['byte_ranges'], new) if keep],
+                    entry['indexed_at']
+                )
+            self.lexical.add_many(chunk_ids, entry['chunks'])
+        elif op == 'remove':
+            chunk_ids = np.array(entry['chunk_ids'], dtype='int64')
+            rows = self.metadata.rows_for_ids(chunk_ids)
+            by_shard = self._chunk_ids_by_shard(rows)
+            for row in rows:
+                self.lexical.remove(int(self.metadata.ids[row]), self.metadata.text(row))
+            if self.embeddings.checkpoint_seq is not None and entry['seq'] > self.embeddings.checkpoint_seq:
+                # Tombstones logged after the embedding store's last checkpoint
+                self.embeddings.delete_rows(rows)
+            self.metadata.delete_rows(rows)
+            for name, shard_chunk_ids in by_shard.items():
+                self._remove_from_shard(name, shard_chunk_ids)
+        elif op == 'update_file':
+            self._update_file_record(entry['filepath'], entry['file_attributes'])
+        elif op == 'set_chunk_indexes':
+            chunk_ids = np.array(entry['chunk_ids'], dtype='int64')
+            present = np.isin(chunk_ids, self.metadata.ids)
+            self.metadata.set_chunk_indexes(
+                self.metadata.rows_for_ids(chunk_ids[present]),
+                np.array(entry['chunk_indexes'])[present]
+            )
+    
+    def _migrate_legacy_metadata(self, documents: List[Dict]):
+        """
+        Convert a metadata.pkl store to the columnar metadata format.
+        
+        Positional IndexFlatL2 stores (from before chunk IDs) are converted to
+        an ID-mapped index on the way; their vectors are copied out of the flat
+        index as-is, so the migration does not need the embedding model.
+        """
+        legacy = self._legacy_shard
+        if not vector_index.is_id_mapped(legacy.index):
+            print("Migrating legacy FAISS index to stable chunk IDs...")
+            count = min(legacy.ntotal, len(documents))
+            vectors = legacy.index.reconstruct_n(0, count) if count else None
+            
+            documents = documents[:count]
+            for i, doc in enumerate(documents):
+                doc['chunk_id'] = i
+            
+            legacy.rebuild("flat", [(vectors, np.arange(count, dtype='int64'))] if count else [])
+            self.embeddings.reset(vectors)
+        
+        # Metadata rows must be ordered by chunk ID; keep the vectors aligned
+        order = sorted(range(len(documents)), key=lambda i: documents[i]['chunk_id'])
+        if order != list(range(len(documents))) and len(self.embeddings) == len(documents):
+            self.embeddings.reset(self.embeddings.get_rows(order))
+        documents = [documents[i] for i in order]
+        
+        print(f"Migrating {len(documents)} chunks from metadata.pkl to columnar metadata...")
+        self.metadata.import_documents(documents)
+        self._rebuild_lexical_index()
+        self.legacy_metadata_path.unlink()
+    
+    def _rebuild_lexical_index(self):
+        """Re-tokenize every stored chunk into a fresh BM25 index."""
+        print(f"Building lexical index over {len(self.metadata)} chunks...")
+        self.lexical.clear()
+        for row in range(len(self.metadata)):
+            self.lexical.add(int(self.metadata.ids[row]), self.metadata.text(row))
+        self.lexical.merge()
+        self.legacy_lexical_path.unlink(missing_ok=True)
+    
+    def _backfill_embeddings(self):
+        """Recreate the embedding store from the vectors held by the index."""
+        print(f"Embedding store out of sync ({len(self.embeddings)} rows for "
+              f"{len(self.metadata)} chunks), restoring it from the FAISS index")
+        vectors = np.empty((len(self.metadata), self.dimension), dtype='float32')
+        if self._legacy_shard is not None:
+            if len(self.metadata):
+                vectors[:] = self._legacy_shard.reconstruct(self.metadata.ids)
+        else:
+            for name, rows in self._shard_rows().items():
+                if name in self._stale_shards or name not in self.shards:
+                    raise ValueError(f"Shard {name} is unreadable and the embedding store is out of sync")
+                vectors[rows] = self.shards[name].reconstruct(self.metadata.ids[rows])
+        self.embeddings.reset(vectors)
+    
+    def _maybe_promote_index(self) -> bool:
+        """
+        Switch shards to the configured ANN backend once they are big enough,
+        and re-encode shards whose vector codec no longer matches the settings.
+        """
+        promoted = False
+        for name, shard in list(self.shards.items()):
+            if name in self._stale_shards:
+                continue
+            target = vector_index.choose_backend(shard.live_count)
+            if shard.backend == "flat" and target != "flat":
+                print(f"Shard {name} reached {shard.live_count} chunks, promoting from flat to {target}")
+                self.rebuild_shard(name, target)
+                promoted = True
+            elif vector_index.needs_recode(shard.index, shard.live_count):
+                codec = vector_index.choose_codec(shard.backend, shard.live_count)
+                print(f"Re-encoding shard {name} from {shard.codec} to {codec}")
+                self.rebuild_shard(name)
+                promoted = True
+        return promoted
+    
+    def rebuild_shard(self, name: str, backend: Optional[str] = None):
+        """
+        Rebuild one shard from the persisted embedding matrix.
+        
+        Keeps the shard's current backend unless another one is requested.
+        Vectors are read from disk, so rebuilding never runs the embedding
+        model, and no other shard is touched.
+        """
+        with self._lock:
+            rows = self._shard_rows().get(name, np.empty(0, dtype='int64'))
+            if backend is None:
+                backend = self.shards[name].backend if name in self.shards and name not in self._stale_shards \
+                    else vector_index.choose_backend(len(rows))
+            if len(rows) < vector_index.min_training_points(backend, len(rows)):
+                backend = "flat"
+            codec = vector_index.choose_codec(backend, len(rows))
+            
+            print(f"Rebuilding {backend} ({codec}) shard {name} from {len(rows)} stored embeddings...")
+            batch_rows = self.embeddings.COPY_BATCH_ROWS
+            batches = (
+                (self.embeddings.get_rows(rows[start:start + batch_rows]), self.metadata.ids[rows[start:start + batch_rows]])
+                for start in range(0, len(rows), batch_rows)
+            )
+            self._get_shard(name).rebuild(backend, batches, self._training_sample(backend, codec, rows), codec)
+            self._stale_shards.discard(name)
+    
+    def rebuild_index(self, backend: Optional[str] = None):
+        """Rebuild every shard from the persisted embeddings and write a checkpoint."""
+        with self._lock:
+            for name in sorted(self._shard_rows()):
+                self.rebuild_shard(name, backend)
+            self._save_index()
+    
+    def _training_sample(self, backend: str, codec: str, rows: np.ndarray) -> Optional[np.ndarray]:
+        """Random sample of a shard's stored vectors for backends and codecs that need training."""
+        count = len(rows)
+        if backend == "ivfpq":
+            sample_size = min(count, vector_index.ivf_nlist(count) * 64)
+        elif codec == "pq":
+            sample_size = min(count, vector_index.PQ_CODEC_MIN_POINTS * 4)
+        else:
+            return None
+        positions = np.sort(np.random.default_rng(0).choice(count, sample_size, replace=False))
+        return self.embeddings.get_rows(rows[positions])
 
 
 # Global RAG system instance
 rag_system: Optional[RAGSystem] = None
+_initialize_task: Optional[asyncio.Task] = None
 
 
-async def get_rag_system() -> RAGSystem:
-    """Get or create RAG system instance."""
-    global rag_system
+def start_rag_system() -> asyncio.Task:
+    """Create the RAG system and start loading/indexing it in the background."""
+    global rag_system, _initialize_task
     if rag_system is None:
         rag_system = RAGSystem()
-        await rag_system.initialize()
+    if _initialize_task is None:
+        _initialize_task = asyncio.create_task(rag_system.initialize())
+    return _initialize_task
+
+
+def get_rag_system_nowait() -> RAGSystem:
+    """
+    Get RAG system instance without waiting for startup indexing.
+    
+    Note changes made before it is ready are applied once indexing finishes.
+    """
+    start_rag_system()
     return rag_system
+
+
+def get_ready_rag_system() -> Optional[RAGSystem]:
+    """Get RAG system instance only if it is ready to serve searches."""
+    if rag_system is not None and rag_system.ready:
+        return rag_system
+    return None
+
+
+def get_rag_status() -> Dict:
+    """Readiness and indexing progress of the RAG system."""
+    if rag_system is None:
+        return {'ready': False, 'state': 'not_started'}
+    return rag_system.get_status()
+
+
+async def shutdown_rag_system():
+    """Stop background indexing and release the RAG executor."""
+    if _initialize_task is not None and not _initialize_task.done():
+        _initialize_task.cancel()
+        try:
+            await _initialize_task
+        except asyncio.CancelledError:
+            pass
+    if rag_system is not None:
+        await rag_system.stop_background_tasks()
+        rag_system.close()
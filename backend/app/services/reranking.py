@@ -0,0 +1,43 @@
+from typing import List
+
+import numpy as np
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def mmr_select(relevance: np.ndarray, vectors: np.ndarray, k: int,
+               lambda_: float = 0.7, duplicate_threshold: float = 0.95) -> List[int]:
+    """
+    Pick ``k`` candidates by maximal marginal relevance.
+
+    Each step takes the candidate maximizing
+    ``lambda_ * relevance - (1 - lambda_) * max cosine to the picks so far``.
+    Candidates whose cosine similarity to an already picked one exceeds
+    ``duplicate_threshold`` (overlapping chunks, stale copies of a note) are
+    dropped outright, so fewer than ``k`` indices may come back.
+
+    ``relevance`` should be on a 0..1 scale; returns positions into the
+    candidate arrays in pick order.
+    """
+    count = len(relevance)
+    if count == 0 or k <= 0:
+        return []
+
+    similarity = normalize_rows(np.asarray(vectors, dtype='float32'))
+    similarity = similarity @ similarity.T
+
+    selected: List[int] = []
+    available = np.ones(count, dtype=bool)
+    redundancy = np.zeros(count, dtype='float32')
+    while len(selected) < k and available.any():
+        scores = lambda_ * relevance - (1 - lambda_) * redundancy
+        scores[~available] = -np.inf
+        pick = int(np.argmax(scores))
+        selected.append(pick)
+        available[pick] = False
+        available &= similarity[pick] <= duplicate_threshold
+        redundancy = np.maximum(redundancy, similarity[pick])
+    return selected
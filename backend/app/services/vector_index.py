@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import math
+from typing import Iterable, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.utils.lazy_import import lazy_import
+
+faiss = lazy_import("faiss")
+
+
+# Supported index backends. Flat and HNSW are wrapped in an IndexIDMap2 keyed
+# by chunk ID, IVF indexes store the chunk IDs natively.
+INDEX_BACKENDS = ("flat", "hnsw", "ivfpq")
+
+# How vectors are stored inside flat and HNSW indexes. Anything but float32
+# is lossy, so searches over quantized shards are re-ranked exactly from the
+# embedding store. IVF-PQ always stores PQ codes.
+VECTOR_CODECS = ("float32", "fp16", "sq8", "pq")
+
+# Product quantization uses 8-bit codes, which needs 256 training points per
+# sub-quantizer codebook
+PQ_MIN_TRAINING_POINTS = 256
+
+# k-means wants ~39 points per centroid; below that PQ codebooks are poor
+# enough that the PQ codec is not worth it
+PQ_CODEC_MIN_POINTS = 39 * 256
+
+
+def ivf_nlist(ntotal: int) -> int:
+    """Number of IVF lists to use for a store of ``ntotal`` vectors."""
+    if settings.rag_ivf_nlist > 0:
+        return settings.rag_ivf_nlist
+    return int(min(65536, max(16, 4 * math.sqrt(max(ntotal, 1)))))
+
+
+def min_training_points(backend: str, ntotal: int) -> int:
+    """Smallest corpus a backend can be built from."""
+    if backend == "ivfpq":
+        return max(ivf_nlist(ntotal), PQ_MIN_TRAINING_POINTS)
+    return 0
+
+
+def choose_codec(backend: str, ntotal: int) -> str:
+    """
+    Pick the vector codec for an index of ``backend`` holding ``ntotal`` vectors.
+
+    PQ codebooks need plenty of training data, so smaller shards use 8-bit
+    scalar quantization until they grow.
+    """
+    if backend == "ivfpq":
+        return "pq"
+    codec = settings.rag_vector_codec
+    if codec not in VECTOR_CODECS:
+        print(f"Unknown vector codec '{codec}', falling back to float32")
+        return "float32"
+    if codec == "pq" and ntotal < PQ_CODEC_MIN_POINTS:
+        return "sq8"
+    return codec
+
+
+def needs_recode(index: faiss.Index, ntotal: int) -> bool:
+    """Whether an index's codec no longer matches the configured one."""
+    current = get_codec(index)
+    target = choose_codec(get_backend(index), ntotal)
+    # A PQ index that shrank below the PQ threshold is kept as it is
+    if current == "pq" and settings.rag_vector_codec == "pq":
+        return False
+    return current != target
+
+
+def choose_backend(ntotal: int) -> str:
+    """
+    Pick the backend for a store holding ``ntotal`` vectors.
+
+    Small stores stay on an exact flat scan. Once the store crosses
+    ``rag_ann_promotion_threshold`` it is promoted to the configured ANN
+    backend so query latency stops growing with the corpus.
+    """
+    backend = settings.rag_index_backend
+    if backend not in INDEX_BACKENDS:
+        print(f"Unknown index backend '{backend}', falling back to flat")
+        return "flat"
+    if backend == "flat" or ntotal < settings.rag_ann_promotion_threshold:
+        return "flat"
+    if ntotal < min_training_points(backend, ntotal):
+        return "flat"
+    return backend
+
+
+def _scalar_quantizer_type(codec: str) -> int:
+    if codec == "fp16":
+        return faiss.ScalarQuantizer.QT_fp16
+    return faiss.ScalarQuantizer.QT_8bit_uniform
+
+
+def _train_codec(index: faiss.Index, codec: str, dimension: int,
+                 training_vectors: Optional[np.ndarray]):
+    if codec == "sq8":
+        # Sentence embeddings are unit length, so every component lies in
+        # [-1, 1]; a fixed range needs no training data and never drifts
+        bounds = np.stack([-np.ones(dimension), np.ones(dimension)]).astype('float32')
+        index.train(bounds)
+    elif codec == "pq":
+        if training_vectors is None:
+            raise ValueError("PQ codec needs training vectors")
+        index.train(np.ascontiguousarray(training_vectors, dtype='float32'))
+
+
+def create_index(backend: str, dimension: int, training_vectors: Optional[np.ndarray] = None,
+                 codec: str = "float32") -> faiss.Index:
+    """
+    Create an empty ID-mapped index, training it first when the backend or
+    codec needs it.
+    """
+    if backend == "flat":
+        if codec == "float32":
+            inner = faiss.IndexFlatL2(dimension)
+        elif codec == "pq":
+            inner = faiss.IndexPQ(dimension, settings.rag_pq_m, 8)
+        else:
+            inner = faiss.IndexScalarQuantizer(dimension, _scalar_quantizer_type(codec))
+        _train_codec(inner, codec, dimension, training_vectors)
+    elif backend == "hnsw":
+        if codec == "float32":
+            inner = faiss.IndexHNSWFlat(dimension, settings.rag_hnsw_m)
+        elif codec == "pq":
+            inner = faiss.IndexHNSWPQ(dimension, settings.rag_pq_m, settings.rag_hnsw_m)
+        else:
+            inner = faiss.IndexHNSWSQ(dimension, _scalar_quantizer_type(codec), settings.rag_hnsw_m)
+        inner.hnsw.efConstruction = settings.rag_hnsw_ef_construction
+        _train_codec(inner, codec, dimension, training_vectors)
+    elif backend == "ivfpq":
+        if training_vectors is None:
+            raise ValueError("IVF-PQ index needs training vectors")
+        quantizer = faiss.IndexFlatL2(dimension)
+        index = faiss.IndexIVFPQ(quantizer, dimension, ivf_nlist(len(training_vectors)), settings.rag_pq_m, 8)
+        index.train(np.ascontiguousarray(training_vectors, dtype='float32'))
+        # Hashtable direct map allows remove_ids and reconstruct by chunk ID
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+        configure_search(index)
+        return index
+    else:
+        raise ValueError(f"Unknown index backend: {backend}")
+
+    index = faiss.IndexIDMap2(inner)
+    configure_search(index)
+    return index
+
+
+def is_id_mapped(index: faiss.Index) -> bool:
+    """Whether the index is addressed by chunk ID rather than by position."""
+    return isinstance(index, (faiss.IndexIDMap2, faiss.IndexIVF))
+
+
+def _inner(index: faiss.Index) -> faiss.Index:
+    if isinstance(index, faiss.IndexIDMap2):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def get_backend(index: faiss.Index) -> str:
+    """Return the backend name of an ID-mapped index."""
+    inner = _inner(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVF):
+        return "ivfpq"
+    return "flat"
+
+
+def get_codec(index: faiss.Index) -> str:
+    """Return how an ID-mapped index stores its vectors."""
+    inner = _inner(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner = faiss.downcast_index(inner.storage)
+    if isinstance(inner, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return "pq"
+    if isinstance(inner, faiss.IndexScalarQuantizer):
+        return "fp16" if inner.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    return "float32"
+
+
+def is_lossy(index: faiss.Index) -> bool:
+    """Whether search distances are approximated from compressed codes."""
+    return get_codec(index) != "float32"
+
+
+def configure_search(index: faiss.Index):
+    """Apply the query-time knobs (efSearch / nprobe) from settings."""
+    inner = _inner(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = settings.rag_hnsw_ef_search
+    elif isinstance(inner, faiss.IndexIVF):
+        inner.nprobe = settings.rag_ivf_nprobe
+
+
+def supports_removal(index: faiss.Index) -> bool:
+    """HNSW graphs cannot drop vectors, deleted chunks are tombstoned instead."""
+    return get_backend(index) != "hnsw"
+
+
+def search_params(index: faiss.Index, k: int, excluded_ids: Iterable[int] = (),
+                  allowed_ids: Optional[np.ndarray] = None) -> Optional[faiss.SearchParameters]:
+    """
+    Search parameters that restrict the index scan to a subset of chunk IDs.
+
+    ``allowed_ids`` keeps only those IDs (metadata filters), ``excluded_ids``
+    skips the given ones (tombstones). Filtering happens inside the ANN
+    search, so the top-k is taken among matching chunks only.
+    """
+    if allowed_ids is not None:
+        selector = faiss.IDSelectorBatch(np.ascontiguousarray(allowed_ids, dtype='int64'))
+    else:
+        excluded = np.fromiter(excluded_ids, dtype='int64')
+        if len(excluded) == 0:
+            return None
+        selector = faiss.IDSelectorNot(faiss.IDSelectorBatch(excluded))
+
+    inner = _inner(index)
+    if isinstance(inner, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=settings.rag_ivf_nprobe)
+    if isinstance(inner, faiss.IndexHNSW):
+        # A restrictive filter leaves fewer reachable neighbours, widen the beam
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=max(settings.rag_hnsw_ef_search, k))
+    return faiss.SearchParameters(sel=selector)
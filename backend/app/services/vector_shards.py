@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.services import vector_index
+from app.utils.lazy_import import lazy_import
+
+faiss = lazy_import("faiss")
+
+
+# Fixed shards; notes filed in a folder get a "folder-<id>" shard each
+NOTES_SHARD = "notes"
+DOCUMENTS_SHARD = "documents"
+HISTORY_SHARD = "history"
+
+
+def shard_for_record(record: Dict, history_file: str) -> str:
+    """Name of the shard holding the chunks of a metadata file record."""
+    if record.get('note_id') is not None:
+        if record.get('folder_id'):
+            return f"folder-{record['folder_id']}"
+        return NOTES_SHARD
+    if record['filepath'] == history_file:
+        return HISTORY_SHARD
+    return DOCUMENTS_SHARD
+
+
+class VectorShard:
+    """
+    One independently stored FAISS index over a subset of the chunks.
+
+    Each shard picks its own backend from its own size and is rebuilt,
+    promoted and written to disk on its own, so a change in one course
+    folder never rewrites the vectors of another.
+    """
+
+    def __init__(self, name: str, directory: Path, dimension: int):
+        self.name = name
+        self.path = Path(directory) / f"{name}.index"
+        self.dimension = dimension
+        self.index: faiss.Index = vector_index.create_index("flat", dimension, codec=vector_index.choose_codec("flat", 0))
+        # Chunk IDs deleted from indexes that cannot remove vectors (HNSW);
+        # they are skipped at search time until the next rebuild
+        self.tombstones: set = set()
+        self.dirty = True
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    @property
+    def live_count(self) -> int:
+        return self.index.ntotal - len(self.tombstones)
+
+    @property
+    def backend(self) -> str:
+        return vector_index.get_backend(self.index)
+
+    @property
+    def codec(self) -> str:
+        return vector_index.get_codec(self.index)
+
+    def add(self, vectors: np.ndarray, chunk_ids: np.ndarray):
+        self.index.add_with_ids(vectors, chunk_ids)
+        self.dirty = True
+
+    def add_missing(self, vectors: np.ndarray, chunk_ids: np.ndarray):
+        """Idempotent add, used when replaying logged changes."""
+        if vector_index.supports_removal(self.index):
+            self.index.remove_ids(chunk_ids)
+            self.index.add_with_ids(vectors, chunk_ids)
+        else:
+            fresh = ~np.isin(chunk_ids, faiss.vector_to_array(self.index.id_map))
+            if fresh.any():
+                self.index.add_with_ids(vectors[fresh], chunk_ids[fresh])
+            self.tombstones.difference_update(int(chunk_id) for chunk_id in chunk_ids)
+        self.dirty = True
+
+    def remove(self, chunk_ids: np.ndarray) -> bool:
+        """Drop chunks; returns True once tombstones call for a rebuild."""
+        self.dirty = True
+        if vector_index.supports_removal(self.index):
+            self.index.remove_ids(np.asarray(chunk_ids, dtype='int64'))
+            return False
+        self.tombstones.update(int(chunk_id) for chunk_id in chunk_ids)
+        return len(self.tombstones) > settings.rag_tombstone_rebuild_ratio * self.index.ntotal
+
+    def search(self, query_embedding: np.ndarray, k: int,
+               allowed_ids: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Nearest ``(chunk_id, L2 distance)`` pairs within this shard."""
+        if self.live_count <= 0:
+            return []
+        search_kwargs = {}
+        params = vector_index.search_params(self.index, k, self.tombstones, allowed_ids)
+        if params is not None:
+            search_kwargs['params'] = params
+        distances, indices = self.index.search(
+            query_embedding.reshape(1, -1),
+            min(k, self.index.ntotal),
+            **search_kwargs
+        )
+        # -1 marks an empty slot
+        return [(int(chunk_id), float(distance))
+                for chunk_id, distance in zip(indices[0], distances[0]) if chunk_id >= 0]
+
+    def reconstruct(self, chunk_ids: np.ndarray) -> np.ndarray:
+        return self.index.reconstruct_batch(np.asarray(chunk_ids, dtype='int64'))
+
+    def rebuild(self, backend: str, batches: Iterable[Tuple[np.ndarray, np.ndarray]],
+                training_vectors: Optional[np.ndarray] = None, codec: str = "float32"):
+        """Replace the index with a fresh one built from ``(vectors, chunk_ids)`` batches."""
+        index = vector_index.create_index(backend, self.dimension, training_vectors, codec)
+        for vectors, chunk_ids in batches:
+            index.add_with_ids(vectors, chunk_ids)
+        self.index = index
+        self.tombstones = set()
+        self.dirty = True
+
+    def save(self):
+        tmp_path = self.path.with_suffix(".tmp")
+        faiss.write_index(self.index, str(tmp_path))
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def load(self, live_ids: np.ndarray, mmap: bool = False):
+        """
+        Read the index and derive tombstones from the chunks still in metadata.
+
+        With ``mmap`` the vector codes stay in the page cache instead of
+        process memory, so reader processes share one copy; such an index
+        must not be modified.
+        """
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+        self.index = faiss.read_index(str(self.path), flags)
+        vector_index.configure_search(self.index)
+        self.tombstones = set()
+        if not vector_index.supports_removal(self.index):
+            indexed_ids = faiss.vector_to_array(self.index.id_map)
+            self.tombstones = {int(i) for i in np.setdiff1d(indexed_ids, live_ids)}
+        self.dirty = False
@@ -0,0 +1,260 @@
+import re
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.file_processor import StreamingChunker, chunk_text
+
+
+# "fixed" is the original 800/100 character window, "structured" packs
+# headings, paragraphs and sentences into chunks measured in model tokens
+CHUNKING_STRATEGIES = ("fixed", "structured")
+
+FIXED_CHUNK_SIZE = 800
+FIXED_CHUNK_OVERLAP = 100
+
+# Token estimate used when no tokenizer is available
+CHARS_PER_TOKEN = 4
+
+# Tokens the model adds around every input ([CLS] ... [SEP])
+SPECIAL_TOKENS = 2
+
+HEADING_RE = re.compile(r'^\s{0,3}#{1,6}\s+\S')
+# A sentence ends at . ! or ? followed by whitespace and a capital, digit or opening quote/bracket
+SENTENCE_BREAK_RE = re.compile(r'(?<=[.!?])\s+(?=["\'(\[]?[A-Z0-9])')
+
+# Separators used to join units back into chunk text
+PARAGRAPH_SEP = "\n\n"
+SENTENCE_SEP = " "
+
+
+class FixedChunker(StreamingChunker):
+    """The original character-window chunker behind the common chunker interface."""
+
+    signature = f"fixed-{FIXED_CHUNK_SIZE}-{FIXED_CHUNK_OVERLAP}"
+
+    def __init__(self):
+        super().__init__(FIXED_CHUNK_SIZE, FIXED_CHUNK_OVERLAP)
+
+    def chunk(self, text: str) -> List[str]:
+        return chunk_text(text, chunk_size=FIXED_CHUNK_SIZE, overlap=FIXED_CHUNK_OVERLAP)
+
+
+class StructuredChunker:
+    """
+    Chunks that follow the document's structure and fit the model's input.
+
+    Text is split into sections at markdown headings and into paragraphs at
+    blank lines; a paragraph longer than the token budget is split into
+    sentences, and a sentence longer than the budget into token windows.
+    The units of a section are then packed greedily into chunks of at most
+    ``max_tokens`` tokens, with up to ``overlap_tokens`` of trailing units
+    repeated at the start of the next chunk. Chunks never span a heading,
+    except that a section too small to stand alone (a heading and a line)
+    is carried into the next one.
+
+    All units of a text are tokenized in one batched call of the fast
+    tokenizer, and packing is a cumulative sum plus ``searchsorted`` per
+    chunk, so chunking costs little next to embedding. Without a tokenizer,
+    token counts are estimated from the character count.
+
+    ``feed``/``close`` accept text in segments as it is extracted; the text
+    buffered so far is chunked at the last paragraph (or line) break once it
+    is large enough, so memory stays bounded for long documents.
+    """
+
+    # Chunk the buffered stream once it holds this many budgets of text
+    STREAM_FLUSH_BUDGETS = 16
+
+    def __init__(self, tokenizer=None, max_tokens: int = 254, overlap_tokens: int = 32):
+        self.tokenizer = tokenizer
+        self.max_tokens = max(8, max_tokens)
+        self.overlap_tokens = max(0, min(overlap_tokens, self.max_tokens // 2))
+        # Sections smaller than this are merged into the next one instead
+        # of becoming chunks of a heading and a line
+        self.min_section_tokens = self.max_tokens // 4
+        self.signature = f"structured-{self.max_tokens}-{self.overlap_tokens}"
+        self._buffer = ""
+
+    # ------------------------------------------------------------------
+    # Whole-text and streaming entry points
+    # ------------------------------------------------------------------
+
+    def chunk(self, text: str) -> List[str]:
+        if not text or not text.strip():
+            return []
+        sections = self._sections(text)
+        if not sections:
+            return []
+
+        # One tokenizer call for every paragraph of the text
+        paragraphs = [paragraph for section in sections for paragraph in section]
+        lengths = self.count_tokens(paragraphs)
+
+        chunks = []
+        position = 0
+        pending: List[Tuple[str, str]] = []
+        pending_lengths: List[int] = []
+        for section in sections:
+            section_lengths = lengths[position:position + len(section)]
+            position += len(section)
+            units, unit_lengths = self._units(section, section_lengths)
+            pending.extend(units)
+            pending_lengths.extend(unit_lengths)
+            if sum(pending_lengths) < self.min_section_tokens:
+                continue  # Too small to stand alone, carried into the next section
+            chunks.extend(self._pack(pending, np.array(pending_lengths)))
+            pending, pending_lengths = [], []
+        if pending:
+            chunks.extend(self._pack(pending, np.array(pending_lengths)))
+        return chunks
+
+    def feed(self, text: str) -> List[str]:
+        self._buffer += text
+        if len(self._buffer) < self.STREAM_FLUSH_BUDGETS * self.max_tokens * CHARS_PER_TOKEN:
+            return []
+        cut = self._buffer.rfind(PARAGRAPH_SEP)
+        if cut <= 0:
+            cut = self._buffer.rfind("\n")
+        if cut <= 0:
+            return []
+        head, self._buffer = self._buffer[:cut], self._buffer[cut:]
+        return self.chunk(head)
+
+    def close(self) -> List[str]:
+        text, self._buffer = self._buffer, ""
+        return self.chunk(text)
+
+    # ------------------------------------------------------------------
+    # Token counting
+    # ------------------------------------------------------------------
+
+    def count_tokens(self, texts: List[str]) -> np.ndarray:
+        """Token counts of ``texts`` (without special tokens), in one batch."""
+        if not texts:
+            return np.zeros(0, dtype='int64')
+        if self.tokenizer is None:
+            return np.array([len(text) for text in texts], dtype='int64') // CHARS_PER_TOKEN + 1
+        encoded = self.tokenizer(
+            texts,
+            add_special_tokens=False,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+            verbose=False
+        )
+        return np.array([len(ids) for ids in encoded['input_ids']], dtype='int64')
+
+    def _token_windows(self, text: str) -> List[str]:
+        """Split text with no usable breaks into windows of ``max_tokens`` tokens."""
+        step = self.max_tokens - self.overlap_tokens
+        offsets = None
+        if self.tokenizer is not None:
+            try:
+                offsets = self.tokenizer(
+                    text, add_special_tokens=False, return_offsets_mapping=True, verbose=False
+                )['offset_mapping']
+            except NotImplementedError:
+                pass  # Only fast (Rust) tokenizers report offsets
+        if offsets is None:
+            size = self.max_tokens * CHARS_PER_TOKEN
+            return [text[start:start + size] for start in range(0, len(text), step * CHARS_PER_TOKEN)
+                    if text[start:start + size].strip()]
+        windows = []
+        for start in range(0, len(offsets), step):
+            window = offsets[start:start + self.max_tokens]
+            windows.append(text[window[0][0]:window[-1][1]])
+            if start + self.max_tokens >= len(offsets):
+                break
+        return windows
+
+    # ------------------------------------------------------------------
+    # Structure
+    # ------------------------------------------------------------------
+
+    def _sections(self, text: str) -> List[List[str]]:
+        """Paragraphs grouped into sections, a new section at every heading."""
+        sections: List[List[str]] = [[]]
+        lines: List[str] = []
+
+        def end_paragraph():
+            paragraph = "\n".join(lines).strip()
+            if paragraph:
+                sections[-1].append(paragraph)
+            lines.clear()
+
+        for line in text.splitlines():
+            if HEADING_RE.match(line):
+                end_paragraph()
+                if sections[-1]:
+                    sections.append([])
+                lines.append(line)
+                end_paragraph()
+            elif not line.strip():
+                end_paragraph()
+            else:
+                lines.append(line)
+        end_paragraph()
+        return [section for section in sections if section]
+
+    def _units(self, paragraphs: List[str], lengths: np.ndarray) -> Tuple[List[Tuple[str, str]], List[int]]:
+        """``(separator, text)`` units of a section that each fit the budget."""
+        units: List[Tuple[str, str]] = []
+        unit_lengths: List[int] = []
+        for paragraph, length in zip(paragraphs, lengths):
+            if length <= self.max_tokens:
+                units.append((PARAGRAPH_SEP, paragraph))
+                unit_lengths.append(int(length))
+                continue
+
+            sentences = [sentence for sentence in SENTENCE_BREAK_RE.split(paragraph) if sentence.strip()]
+            sentence_lengths = self.count_tokens(sentences)
+            separator = PARAGRAPH_SEP
+            for sentence, sentence_length in zip(sentences, sentence_lengths):
+                if sentence_length <= self.max_tokens:
+                    pieces, piece_lengths = [sentence], [int(sentence_length)]
+                else:
+                    pieces = self._token_windows(sentence)
+                    piece_lengths = [int(n) for n in self.count_tokens(pieces)]
+                for piece, piece_length in zip(pieces, piece_lengths):
+                    units.append((separator, piece))
+                    unit_lengths.append(min(piece_length, self.max_tokens))
+                    separator = SENTENCE_SEP
+        return units, unit_lengths
+
+    def _pack(self, units: List[Tuple[str, str]], lengths: np.ndarray) -> List[str]:
+        """Greedily pack consecutive units into chunks within the token budget."""
+        # cumulative[i] = tokens in units[:i]
+        cumulative = np.concatenate(([0], np.cumsum(lengths)))
+        chunks = []
+        start = 0
+        while start < len(units):
+            end = int(np.searchsorted(cumulative, cumulative[start] + self.max_tokens, side='right')) - 1
+            end = max(end, start + 1)
+            chunks.append(units[start][1] + "".join(separator + text for separator, text in units[start + 1:end]))
+            if end >= len(units):
+                break
+            # Repeat trailing units worth at most overlap_tokens, but always move forward
+            overlap_start = int(np.searchsorted(cumulative, cumulative[end] - self.overlap_tokens, side='left'))
+            start = max(overlap_start, start + 1)
+        return chunks
+
+
+def create_chunker(strategy: str, model=None, max_tokens: int = 0, overlap_tokens: int = 32):
+    """
+    Chunker for ``strategy``; the structured one measures chunks with the
+    model's tokenizer and, unless ``max_tokens`` is set, fills the model's
+    maximum sequence length.
+    """
+    if strategy not in CHUNKING_STRATEGIES:
+        print(f"Unknown chunking strategy '{strategy}', falling back to fixed")
+        strategy = "fixed"
+    if strategy == "fixed":
+        return FixedChunker()
+
+    tokenizer: Optional[object] = getattr(model, 'tokenizer', None)
+    if not callable(tokenizer):
+        tokenizer = None
+    if max_tokens <= 0:
+        max_seq_length = getattr(model, 'max_seq_length', None) or 256
+        max_tokens = max_seq_length - SPECIAL_TOKENS
+    return StructuredChunker(tokenizer, max_tokens, overlap_tokens)
@@ -0,0 +1,112 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Optional
+
+from app.config import settings
+
+
+class ExtractionCache:
+    """
+    Persistent cache of extracted document text.
+
+    Entries are keyed by a SHA-256 of (extractor version, SHA-256 of the
+    file bytes), so the same PDF or slide deck uploaded again, under any
+    name and through any route, is served without parsing it. Text is
+    stored zlib-compressed; the cache is bounded to ``max_bytes`` of
+    compressed text and evicts the least recently used documents first.
+    The database is opened on first use.
+    """
+
+    def __init__(self, path: Path, max_bytes: int):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def key(self, content_hash: str, version: int) -> str:
+        return hashlib.sha256(f"{version}\0{content_hash}".encode('utf-8')).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Several server workers may share the file
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS extractions ("
+                "key TEXT PRIMARY KEY, text BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_extractions_last_used ON extractions(last_used)")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached text for ``key``, or None (also when the cache cannot be read)."""
+        if not self.enabled:
+            return None
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute("SELECT text FROM extractions WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                conn.execute("UPDATE extractions SET last_used = ? WHERE key = ?", (time.time(), key))
+                conn.commit()
+            return zlib.decompress(row[0]).decode('utf-8')
+        except (sqlite3.Error, OSError, zlib.error, UnicodeDecodeError) as e:
+            # A locked, read-only or corrupt cache only costs a re-parse
+            print(f"Extraction cache read failed: {e}")
+            return None
+
+    def put(self, key: str, text: str):
+        """Store text for ``key`` and evict old entries if the cache is over its size limit."""
+        if not self.enabled:
+            return
+        blob = zlib.compress(text.encode('utf-8'), 6)
+        if len(blob) > self.max_bytes:
+            return
+
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO extractions (key, text, size, last_used) VALUES (?, ?, ?, ?)",
+                    (key, blob, len(blob), time.time())
+                )
+                excess = conn.execute("SELECT COALESCE(SUM(size), 0) FROM extractions").fetchone()[0] - self.max_bytes
+                if excess > 0:
+                    evict = []
+                    for old_key, size in conn.execute("SELECT key, size FROM extractions ORDER BY last_used ASC"):
+                        if excess <= 0:
+                            break
+                        evict.append((old_key,))
+                        excess -= size
+                    conn.executemany("DELETE FROM extractions WHERE key = ?", evict)
+                conn.commit()
+            except (sqlite3.Error, OSError) as e:
+                print(f"Extraction cache write failed: {e}")
+                if self._conn is not None:
+                    try:
+                        self._conn.rollback()
+                    except sqlite3.Error:
+                        pass
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# Global instance
+extraction_cache = ExtractionCache(
+    Path(__file__).parent.parent.parent / "cache" / "extraction_cache.sqlite",  # backend/cache/
+    settings.extraction_cache_max_mb * 1024 * 1024
+)
@@ -0,0 +1,56 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional
+
+from app.config import settings
+
+
+class ExtractionPool:
+    """
+    Process pool for CPU-heavy document parsing (PDF pages, DOCX).
+
+    Parsing is pure Python and holds the GIL, so threads cannot spread it
+    over cores; worker processes can. The pool is started on first use and
+    at most ``max_pending`` jobs are queued or running at once, so a large
+    upload or ingestion batch waits here instead of piling pickled jobs
+    into the executor. Workers are spawned rather than forked, which keeps
+    them clear of the locks held by the model and FAISS threads in the
+    server process.
+    """
+
+    def __init__(self, workers: int = 0, max_pending: int = 0):
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.max_pending = max_pending if max_pending > 0 else 2 * self.workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    async def run(self, fn: Callable, *args):
+        """Run ``fn(*args)`` in a worker process once a queue slot is free."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+# Global instance
+extraction_pool = ExtractionPool(settings.extraction_workers, settings.extraction_max_pending)
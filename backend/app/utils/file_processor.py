@@ -1,6 +1,10 @@
+import asyncio
+import hashlib
 import os
 import re
-from typing import Union
+from collections import deque
+from functools import partial
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Iterator, List, Optional, Tuple, Union
 from pathlib import Path
 import aiofiles
 from PyPDF2 import PdfReader
@@ -9,31 +13,80 @@ from docx import Document
 from PIL import Image
 import io
 
+from app.config import settings
+from app.utils.extraction_cache import extraction_cache
+from app.utils.extraction_pool import extraction_pool
 
-async def extract_text_from_pdf(file_path: str) -> str:
-    """Extract text from PDF file."""
+
+# Bump whenever a change alters the extracted text; cached extractions made
+# by other versions are then ignored
+EXTRACTOR_VERSION = 1
+
+# Formats worth caching; plain text is read faster than it is looked up
+CACHED_EXTENSIONS = {'.pdf', '.docx'}
+
+HASH_BLOCK_BYTES = 1 << 20
+
+
+def file_content_hash(path: Union[str, Path]) -> str:
+    """sha256 of the file bytes, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# The parse_* functions run inside extraction pool worker processes
+
+def count_pdf_pages(file_path: str) -> int:
+    try:
+        return len(PdfReader(file_path).pages)
+    except Exception:
+        return len(PyPdfReader(file_path).pages)
+
+
+def iter_pdf_pages(file_path: str, start: int = 0, stop: Optional[int] = None) -> Iterator[Optional[str]]:
+    """
+    Yield the text of pages ``[start, stop)`` one page at a time.
+    
+    A page PyPDF2 cannot extract is retried with pypdf (opened only when
+    first needed); a page neither library can read yields None instead of
+    failing the rest of the file.
+    """
     try:
         reader = PdfReader(file_path)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-        return text.strip()
     except Exception as e:
         print(f"Error extracting PDF: {e}")
+        reader = None
+    fallback = None
+    
+    if stop is None:
+        stop = len((reader or PyPdfReader(file_path)).pages)
+    for i in range(start, stop):
+        if reader is not None:
+            try:
+                yield reader.pages[i].extract_text()
+                continue
+            except Exception as e:
+                print(f"Error extracting PDF page {i + 1}: {e}")
         try:
-            # Fallback to pypdf
-            reader = PyPdfReader(file_path)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            return text.strip()
+            # Fallback to pypdf for this page only
+            if fallback is None:
+                fallback = PyPdfReader(file_path)
+            yield fallback.pages[i].extract_text()
         except Exception as e2:
-            print(f"Fallback PDF extraction failed: {e2}")
-            return ""
+            print(f"Fallback PDF extraction failed for page {i + 1}: {e2}")
+            yield None
 
 
-async def extract_text_from_docx(file_path: str) -> str:
-    """Extract text from DOCX file."""
+def parse_pdf_pages(file_path: str, start: int, stop: int) -> Tuple[str, bool]:
+    """Text of pages ``[start, stop)``, one line break after each page, and whether every page was read."""
+    pages = list(iter_pdf_pages(file_path, start, stop))
+    return "".join((page or "") + "\n" for page in pages), None not in pages
+
+
+def parse_docx(file_path: str) -> str:
     try:
         doc = Document(file_path)
         text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
@@ -43,6 +96,21 @@ async def extract_text_from_docx(file_path: str) -> str:
         return ""
 
 
+async def _extract_joined(file_path: str) -> str:
+    parts = [segment async for _, segment in iter_extracted_segments([file_path])]
+    return "".join(parts).strip()
+
+
+async def extract_text_from_pdf(file_path: str) -> str:
+    """Extract text from PDF file, parsing page ranges in parallel worker processes."""
+    return await _extract_joined(file_path)
+
+
+async def extract_text_from_docx(file_path: str) -> str:
+    """Extract text from DOCX file."""
+    return await _extract_joined(file_path)
+
+
 async def extract_text_from_txt(file_path: str) -> str:
     """Extract text from TXT file."""
     try:
@@ -75,6 +143,153 @@ async def extract_text_from_file(file_path: str) -> str:
         return ""
 
 
+async def _cached_text(text: str) -> Tuple[str, bool]:
+    return text, True
+
+
+async def _whole_file(extract: Callable[..., Awaitable[str]], *args) -> Tuple[str, bool]:
+    return await extract(*args), True
+
+
+async def _cache_key(file_path: str) -> Optional[str]:
+    """Extraction cache key of a file, or None if its text is not cached."""
+    if not extraction_cache.enabled or Path(file_path).suffix.lower() not in CACHED_EXTENSIONS:
+        return None
+    try:
+        content_hash = await asyncio.to_thread(file_content_hash, file_path)
+    except OSError:
+        return None
+    return extraction_cache.key(content_hash, EXTRACTOR_VERSION)
+
+
+async def _extraction_jobs(file_path: str) -> AsyncIterator[Callable[[], Awaitable[Tuple[str, bool]]]]:
+    """Jobs that produce a file's text segments in order, each with whether it was read completely."""
+    ext = Path(file_path).suffix.lower()
+    if ext == '.pdf':
+        try:
+            page_count = await extraction_pool.run(count_pdf_pages, file_path)
+        except Exception as e:
+            print(f"Error extracting PDF: {e}")
+            return
+        step = max(1, settings.extraction_pdf_pages_per_task)
+        for start in range(0, page_count, step):
+            yield partial(extraction_pool.run, parse_pdf_pages, file_path, start, min(start + step, page_count))
+    elif ext == '.docx':
+        yield partial(_whole_file, extraction_pool.run, parse_docx, file_path)
+    elif ext == '.txt':
+        yield partial(_whole_file, extract_text_from_txt, file_path)
+    elif ext in ['.md', '.markdown']:
+        yield partial(_whole_file, extract_text_from_md, file_path)
+
+
+async def _next_or_none(iterator):
+    try:
+        return await iterator.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+async def iter_extracted_segments(file_paths: Iterable[Union[str, Path]],
+                                  prefetch: int = 0) -> AsyncIterator[Tuple[int, str]]:
+    """
+    Yield ``(file index, text segment)`` for the files in order.
+    
+    A PDF arrives as one segment per ``extraction_pdf_pages_per_task``
+    pages, other files as a single segment. Up to ``prefetch`` segment jobs
+    (default: one per extraction worker), across file boundaries, are
+    parsed ahead of the caller, so the workers stay busy while the caller
+    processes the current segment, and memory is bounded by the window
+    rather than by the size of the largest file.
+    
+    PDF and DOCX text is looked up in the extraction cache first; a cached
+    file arrives as a single segment without being parsed, and the text of
+    a parsed file is added to the cache once all its segments are read,
+    unless a segment or PDF page failed.
+    """
+    prefetch = prefetch if prefetch > 0 else extraction_pool.workers
+    
+    async def jobs():
+        for index, path in enumerate(file_paths):
+            key = await _cache_key(str(path))
+            text = await asyncio.to_thread(extraction_cache.get, key) if key else None
+            if text is not None:
+                yield index, path, None, partial(_cached_text, text)
+                continue
+            async for job in _extraction_jobs(str(path)):
+                yield index, path, key, job
+    
+    job_iter = jobs()
+    pending = deque()
+    
+    async def fill():
+        while len(pending) < prefetch:
+            entry = await _next_or_none(job_iter)
+            if entry is None:
+                return
+            index, path, key, job = entry
+            pending.append((index, path, key, asyncio.ensure_future(job())))
+    
+    # Segments of the file being read, kept for the cache
+    collected: List[str] = []
+    cacheable = True
+    try:
+        await fill()
+        while pending:
+            index, path, key, task = pending.popleft()
+            await fill()
+            try:
+                segment, complete = await task
+            except Exception as e:
+                print(f"Error extracting {Path(path).name}: {e}")
+                segment, complete = "", False
+            cacheable = cacheable and complete
+            
+            if key is not None:
+                collected.append(segment)
+                # Jobs arrive in file order, so the file is complete once the
+                # next pending job belongs to another file (or there is none)
+                if not pending or pending[0][0] != index:
+                    text = "".join(collected)
+                    if cacheable and text.strip():
+                        await asyncio.to_thread(extraction_cache.put, key, text)
+                    collected, cacheable = [], True
+            yield index, segment
+    finally:
+        for _, _, _, task in pending:
+            task.cancel()
+        await job_iter.aclose()
+
+
+async def iter_extracted_documents(file_paths: Iterable[Union[str, Path]],
+                                   prefetch: int = 0) -> AsyncIterator[Tuple[Union[str, Path], AsyncIterator[str]]]:
+    """
+    Yield ``(path, segments)`` per file, in order, where ``segments`` is an
+    async iterator over the file's text as it is extracted.
+    
+    Segments are read through ``iter_extracted_segments``, so later files
+    are already being parsed while the caller consumes the current one.
+    Whatever the caller leaves unread of a file is skipped.
+    """
+    file_paths = list(file_paths)
+    segments = iter_extracted_segments(file_paths, prefetch)
+    head = [await _next_or_none(segments)]
+    
+    async def document(index: int):
+        while head[0] is not None and head[0][0] == index:
+            segment = head[0][1]
+            head[0] = await _next_or_none(segments)
+            yield segment
+    
+    try:
+        for index, path in enumerate(file_paths):
+            current = document(index)
+            yield path, current
+            async for _ in current:
+                pass
+    finally:
+        await segments.aclose()
+
+
 def chunk_text(text: str, chunk_size: int = 800, overlap: int = 100) -> list[str]:
     """Split text into chunks with overlap."""
     if not text:
@@ -93,6 +308,55 @@ def chunk_text(text: str, chunk_size: int = 800, overlap: int = 100) -> list[str
     return chunks
 
 
+class StreamingChunker:
+    """
+    Incremental ``chunk_text``.
+    
+    Text is fed in segments as it is extracted and every chunk is returned
+    as soon as it is complete. The chunks are the same ones ``chunk_text``
+    produces for the stripped concatenation of all segments, but only the
+    not yet chunked tail of the text is held in memory.
+    """
+    
+    def __init__(self, chunk_size: int = 800, overlap: int = 100):
+        self.chunk_size = chunk_size
+        self.step = chunk_size - overlap
+        self._buffer = ""
+        # Trailing whitespace is held back: it is stripped at the very end
+        self._held_space = ""
+        self._started = False
+    
+    def feed(self, text: str) -> List[str]:
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return []
+            self._started = True
+        body = text.rstrip()
+        if not body:
+            self._held_space += text
+            return []
+        self._buffer += self._held_space + body
+        self._held_space = text[len(body):]
+        
+        chunks = []
+        start = 0
+        while len(self._buffer) - start >= self.chunk_size:
+            chunks.append(self._buffer[start:start + self.chunk_size].strip())
+            start += self.step
+        self._buffer = self._buffer[start:]
+        return chunks
+    
+    def close(self) -> List[str]:
+        chunks = []
+        start = 0
+        while start < len(self._buffer):
+            chunks.append(self._buffer[start:start + self.chunk_size].strip())
+            start += self.step
+        self._buffer = ""
+        return chunks
+
+
 def clean_filename(filename: str) -> str:
     """Clean filename for safe storage."""
     # Remove special characters
@@ -0,0 +1,32 @@
+import importlib.util
+import sys
+import threading
+from types import ModuleType
+
+
+_lock = threading.Lock()
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Return module ``name`` without executing it until an attribute is used.
+
+    Heavy optional dependencies (faiss, pandas, the Gemini SDK) are bound
+    with this at module level so importing the app stays fast and each one
+    is only loaded by the first request that needs its feature. Raises
+    ``ModuleNotFoundError`` right away if the module is not installed.
+    """
+    with _lock:
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+
+        spec = importlib.util.find_spec(name)
+        if spec is None:
+            raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+        loader = importlib.util.LazyLoader(spec.loader)
+        spec.loader = loader
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        loader.exec_module(module)
+        return module
@@ -0,0 +1,64 @@
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """
+    Lock that admits any number of readers at once, or a single writer.
+
+    ``with lock:`` takes the write side, which is reentrant like an
+    ``RLock``; ``with lock.read():`` takes the shared side. A thread holding
+    the write side may also read. Writers that are waiting keep new readers
+    out, so a steady stream of readers cannot starve them.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writer_depth = 0
+        self._writers_waiting = 0
+
+    def acquire(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            self._writers_waiting += 1
+            while self._writer is not None or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def release(self):
+        with self._cond:
+            self._writer_depth -= 1
+            if self._writer_depth == 0:
+                self._writer = None
+                self._cond.notify_all()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            nested = self._writer == threading.get_ident()
+            if not nested:
+                while self._writer is not None or self._writers_waiting:
+                    self._cond.wait()
+                self._readers += 1
+        try:
+            yield
+        finally:
+            if not nested:
+                with self._cond:
+                    self._readers -= 1
+                    if not self._readers:
+                        self._cond.notify_all()
@@ -3,11 +3,14 @@ import sys
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 
 from app.config import settings
 from app.models.database import connect_to_mongo, close_mongo_connection
-from app.services.rag_service import get_rag_system
+from app.services.rag_service import start_rag_system, shutdown_rag_system, get_rag_status
+from app.utils.extraction_cache import extraction_cache
+from app.utils.extraction_pool import extraction_pool
 from app.routes import folders, notes, timetable, todos, assistant, pen2pdf
 
 # Fix for Playwright on Windows - use WindowsSelectorEventLoopPolicy
@@ -23,14 +26,18 @@ async def lifespan(app: FastAPI):
     print("Starting StudyBuddy...")
     await connect_to_mongo()
     
-    # Initialize RAG system
-    print("Initializing RAG system...")
-    await get_rag_system()
+    # Initialize RAG system in the background so the server accepts requests
+    # right away; chat answers without document context until it is ready
+    print("Initializing RAG system in the background...")
+    start_rag_system()
     
     yield
     
     # Shutdown
     print("Shutting down...")
+    await shutdown_rag_system()
+    extraction_pool.shutdown()
+    extraction_cache.close()
     await close_mongo_connection()
 
 
@@ -75,10 +82,17 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint."""
+    """Health check endpoint (liveness)."""
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness endpoint with RAG indexing progress."""
+    status = get_rag_status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
 if __name__ == "__main__":
     import uvicorn
     
@@ -0,0 +1,139 @@
+"""
+Compare the chunking strategies on speed, fit and retrieval hit rate.
+
+For every strategy the script chunks the documents of a directory
+(``data/`` by default) and reports chunks/s, MB/s, the mean chunk length in
+model tokens and the share of tokens the model would silently truncate.
+
+Retrieval is measured with sentences sampled from the documents as
+queries, each with a share of its words dropped so it is not an exact
+substring. The chunks are embedded with the configured embedding model and
+searched exactly; a query is a hit if one of the top-k chunks contains at
+least ``--overlap`` of the sentence's words:
+
+    cd backend
+    python scripts/benchmark_chunking.py
+    python scripts/benchmark_chunking.py --dir ~/lectures --queries 500 -k 3
+    python scripts/benchmark_chunking.py --no-retrieval
+"""
+import argparse
+import asyncio
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config import settings  # noqa: E402
+from app.services.data_watcher import SUPPORTED_EXTENSIONS  # noqa: E402
+from app.services.embedding_backend import load_embedding_model  # noqa: E402
+from app.utils.chunking import CHUNKING_STRATEGIES, SENTENCE_BREAK_RE, create_chunker  # noqa: E402
+from app.utils.extraction_pool import extraction_pool  # noqa: E402
+from app.utils.file_processor import extract_text_from_file  # noqa: E402
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+WORD_RE = re.compile(r"\w+")
+
+
+async def load_documents(directory: Path):
+    files = sorted(path for path in directory.iterdir() if path.suffix.lower() in SUPPORTED_EXTENSIONS)
+    texts = await asyncio.gather(*(extract_text_from_file(str(path)) for path in files))
+    extraction_pool.shutdown()
+    return [(path.name, text) for path, text in zip(files, texts) if text]
+
+
+def sample_queries(documents, count: int, drop: float, seed: int = 0):
+    """``(document index, query, sentence words)`` from sentences of 8 to 40 words."""
+    rng = random.Random(seed)
+    candidates = []
+    for doc_index, (_, text) in enumerate(documents):
+        for sentence in SENTENCE_BREAK_RE.split(text):
+            words = WORD_RE.findall(sentence)
+            if 8 <= len(words) <= 40:
+                candidates.append((doc_index, words))
+    rng.shuffle(candidates)
+
+    queries = []
+    for doc_index, words in candidates[:count]:
+        kept = [word for word in words if rng.random() >= drop] or words
+        queries.append((doc_index, " ".join(kept), {word.lower() for word in words}))
+    return queries
+
+
+def token_counts(model, chunks):
+    tokenizer = getattr(model, 'tokenizer', None)
+    if not callable(tokenizer):
+        return None
+    encoded = tokenizer(chunks, add_special_tokens=True, return_attention_mask=False,
+                        return_token_type_ids=False, verbose=False)
+    return np.array([len(ids) for ids in encoded['input_ids']])
+
+
+def hit_rate(model, chunk_docs, chunks, queries, k: int, overlap: float) -> float:
+    chunk_vectors = np.asarray(model.encode(chunks, batch_size=64), dtype='float32')
+    chunk_vectors /= np.linalg.norm(chunk_vectors, axis=1, keepdims=True) + 1e-12
+    query_vectors = np.asarray(model.encode([query for _, query, _ in queries], batch_size=64), dtype='float32')
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True) + 1e-12
+
+    chunk_words = [{word.lower() for word in WORD_RE.findall(chunk)} for chunk in chunks]
+    scores = query_vectors @ chunk_vectors.T
+    top = np.argsort(-scores, axis=1)[:, :k]
+    hits = 0
+    for (doc_index, _, words), candidates in zip(queries, top):
+        hits += any(
+            chunk_docs[c] == doc_index and len(words & chunk_words[c]) >= overlap * len(words)
+            for c in candidates
+        )
+    return hits / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dir", type=Path, default=BACKEND_DIR / "data", help="directory of documents")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--drop", type=float, default=0.3, help="share of query words dropped")
+    parser.add_argument("--overlap", type=float, default=0.8, help="share of a sentence's words a hit must contain")
+    parser.add_argument("--repeat", type=int, default=3, help="chunking runs per strategy (best is reported)")
+    parser.add_argument("--no-retrieval", action="store_true", help="only measure chunking")
+    args = parser.parse_args()
+
+    documents = asyncio.run(load_documents(args.dir.expanduser()))
+    if not documents:
+        sys.exit(f"No documents with text in {args.dir}")
+    size_mb = sum(len(text.encode('utf-8')) for _, text in documents) / 1e6
+    print(f"{len(documents)} documents, {size_mb:.1f} MB of text")
+
+    model = load_embedding_model(MODEL_NAME, BACKEND_DIR / "vector_store" / "models")
+    queries = [] if args.no_retrieval else sample_queries(documents, args.queries, args.drop)
+    limit = getattr(model, 'max_seq_length', None) or 256
+
+    for strategy in CHUNKING_STRATEGIES:
+        best = None
+        for _ in range(args.repeat):
+            chunker = create_chunker(strategy, model, settings.rag_chunk_max_tokens, settings.rag_chunk_overlap_tokens)
+            started = time.perf_counter()
+            per_doc = [chunker.chunk(text) for _, text in documents]
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        chunks = [chunk for doc_chunks in per_doc for chunk in doc_chunks]
+        chunk_docs = [i for i, doc_chunks in enumerate(per_doc) for _ in doc_chunks]
+
+        line = (f"{strategy:>10}: {len(chunks):6d} chunks  {len(chunks) / best:9.0f} chunks/s  "
+                f"{size_mb / best:6.1f} MB/s")
+        tokens = token_counts(model, chunks)
+        if tokens is not None:
+            truncated = np.maximum(tokens - limit, 0).sum() / tokens.sum()
+            line += f"  {tokens.mean():5.0f} tokens/chunk  {truncated:6.1%} truncated"
+        if queries:
+            line += f"  hit@{args.k} {hit_rate(model, chunk_docs, chunks, queries, args.k, args.overlap):.1%}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Measure how document extraction scales with extraction worker processes.
+
+Extracts every supported file in a directory (``data/`` by default) through
+``iter_extracted_segments`` — the path RAG ingestion uses — once per worker
+count and reports wall time, files/s and extracted MB/s. The extraction
+cache is disabled, so every run parses every file. Pages per job can be
+varied to see how finely long PDFs should be split:
+
+    cd backend
+    python scripts/benchmark_extraction.py
+    python scripts/benchmark_extraction.py --dir ~/lectures --workers 1 2 4 8
+    python scripts/benchmark_extraction.py --pages-per-task 4
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config import settings  # noqa: E402
+from app.services.data_watcher import SUPPORTED_EXTENSIONS  # noqa: E402
+from app.utils import extraction_pool as pool_module  # noqa: E402
+from app.utils import file_processor  # noqa: E402
+
+
+async def run_once(files, workers: int):
+    pool = pool_module.ExtractionPool(workers, settings.extraction_max_pending)
+    # Module-level references resolve the pool at call time
+    file_processor.extraction_pool = pool
+    try:
+        # Start the workers outside the timed region
+        await pool.run(os.getpid)
+        started = time.perf_counter()
+        chars = 0
+        async for _, segment in file_processor.iter_extracted_segments(files):
+            chars += len(segment)
+        return time.perf_counter() - started, chars
+    finally:
+        pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dir", type=Path, default=Path("data"), help="directory of documents to extract")
+    parser.add_argument("--workers", type=int, nargs="+", default=None,
+                        help="worker counts to compare (default: 1 and every power of two up to the core count)")
+    parser.add_argument("--pages-per-task", type=int, default=settings.extraction_pdf_pages_per_task)
+    args = parser.parse_args()
+
+    files = sorted(path for path in args.dir.expanduser().iterdir() if path.suffix.lower() in SUPPORTED_EXTENSIONS)
+    if not files:
+        sys.exit(f"No supported documents in {args.dir}")
+    settings.extraction_pdf_pages_per_task = args.pages_per_task
+    # Cache hits would time lookups instead of parsing, and fill backend/cache
+    file_processor.extraction_cache.max_bytes = 0
+
+    cores = os.cpu_count() or 1
+    workers = args.workers or sorted({1, cores, *(2 ** i for i in range(cores.bit_length()) if 2 ** i <= cores)})
+    size_mb = sum(path.stat().st_size for path in files) / 1e6
+    print(f"{len(files)} files, {size_mb:.1f} MB, {cores} cores, {args.pages_per_task} PDF pages per job")
+
+    baseline = None
+    for count in workers:
+        seconds, chars = asyncio.run(run_once(files, count))
+        baseline = baseline or seconds
+        print(f"  {count:3d} workers: {seconds:7.2f} s  {len(files) / seconds:7.1f} files/s  "
+              f"{size_mb / seconds:6.1f} MB/s  {chars / 1e6:.1f}M chars  x{baseline / seconds:.2f}")
+
+
+if __name__ == "__main__":
+    main()
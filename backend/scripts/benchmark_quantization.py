@@ -0,0 +1,120 @@
+"""
+Measure what quantized vector storage costs in recall and saves in memory.
+
+For every codec the script builds a flat index over the same vectors and
+reports bytes per stored vector, recall@k of the raw quantized search and
+recall@k after exact re-ranking of ``k * rerank`` candidates, the way
+``RAGSystem._dense_search`` does it. Ground truth is an exact float32 scan.
+
+Runs against the embeddings of an existing store (``vector_store/embeddings.bin``)
+or, without one, synthetic clustered unit vectors:
+
+    cd backend
+    python scripts/benchmark_quantization.py
+    python scripts/benchmark_quantization.py --store vector_store --queries 500
+    python scripts/benchmark_quantization.py --synthetic 50000 --rerank 8
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config import settings  # noqa: E402
+from app.services import vector_index  # noqa: E402
+from app.services.embedding_store import EmbeddingStore  # noqa: E402
+
+DIMENSION = 384  # all-MiniLM-L6-v2
+
+
+def load_store_vectors(store_dir: Path) -> np.ndarray:
+    store = EmbeddingStore(store_dir / "embeddings.bin", DIMENSION, read_only=True)
+    return np.asarray(store.vectors, dtype='float32')
+
+
+def synthetic_vectors(count: int, seed: int = 0) -> np.ndarray:
+    """Unit vectors around a few hundred topic centres, like real chunk embeddings."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((max(1, count // 200), DIMENSION)).astype('float32')
+    centres /= np.linalg.norm(centres, axis=1, keepdims=True)
+    noise = rng.standard_normal((count, DIMENSION)).astype('float32') / np.sqrt(DIMENSION)
+    vectors = centres[rng.integers(0, len(centres), count)] + 0.6 * noise
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(vectors: np.ndarray, count: int, seed: int = 1) -> np.ndarray:
+    """Perturbed copies of stored vectors, so each query has close neighbours."""
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(len(vectors), min(count, len(vectors)), replace=False)]
+    queries = queries + 0.05 * rng.standard_normal(queries.shape).astype('float32')
+    return (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype('float32')
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(row) & set(expected)) for row, expected in zip(found, truth))
+    return hits / truth.size
+
+
+def rerank(vectors: np.ndarray, queries: np.ndarray, candidates: np.ndarray, k: int) -> np.ndarray:
+    reranked = np.empty((len(queries), k), dtype='int64')
+    for i, (query, ids) in enumerate(zip(queries, candidates)):
+        ids = ids[ids >= 0]
+        distances = ((vectors[ids] - query) ** 2).sum(axis=1)
+        reranked[i] = ids[np.argsort(distances)[:k]]
+    return reranked
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--store", type=Path, help="vector store directory holding embeddings.bin")
+    parser.add_argument("--synthetic", type=int, default=20000, help="synthetic vectors when no store is given")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--rerank", type=int, default=settings.rag_rerank_multiplier,
+                        help="candidates fetched per result before exact re-ranking")
+    args = parser.parse_args()
+
+    vectors = load_store_vectors(args.store) if args.store else synthetic_vectors(args.synthetic)
+    if len(vectors) == 0:
+        sys.exit("No vectors to benchmark")
+    queries = make_queries(vectors, args.queries)
+    ids = np.arange(len(vectors), dtype='int64')
+    print(f"{len(vectors)} vectors, {len(queries)} queries, recall@{args.k}, re-rank x{args.rerank}\n")
+
+    exact = vector_index.create_index("flat", DIMENSION)
+    exact.add_with_ids(vectors, ids)
+    _, truth = exact.search(queries, args.k)
+
+    sample = vectors[np.random.default_rng(2).choice(len(vectors), min(len(vectors), 20000), replace=False)]
+    print(f"{'codec':<8} {'bytes/vec':>10} {'ratio':>6} {'raw recall':>11} {'reranked':>9} {'ms/query':>9}")
+    float32_bytes = None
+    for codec in vector_index.VECTOR_CODECS:
+        if codec == "pq" and len(vectors) < vector_index.PQ_MIN_TRAINING_POINTS:
+            print(f"{codec:<8} skipped, needs {vector_index.PQ_MIN_TRAINING_POINTS} vectors to train")
+            continue
+        index = vector_index.create_index("flat", DIMENSION, sample, codec)
+        index.add_with_ids(vectors, ids)
+        size = len(faiss.serialize_index(index)) / len(vectors)
+        float32_bytes = float32_bytes or size
+
+        _, raw = index.search(queries, args.k)
+        start = time.perf_counter()
+        if codec == "float32":
+            _, reranked = index.search(queries, args.k)
+        else:
+            _, candidates = index.search(queries, args.k * args.rerank)
+            reranked = rerank(vectors, queries, candidates, args.k)
+        elapsed = (time.perf_counter() - start) * 1000 / len(queries)
+
+        print(f"{codec:<8} {size:>10.0f} {float32_bytes / size:>5.1f}x "
+              f"{recall(raw, truth):>11.3f} {recall(reranked, truth):>9.3f} {elapsed:>9.3f}")
+
+    print("\nbytes/vec includes the 8-byte chunk ID mapping kept next to every code.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Check that the configured embedding backend agrees with the PyTorch model.
+
+Encodes the same texts with the stock PyTorch sentence transformer and with
+the backend selected by ``RAG_EMBEDDING_BACKEND`` / ``RAG_ONNX_QUANTIZATION``
+(or the flags below), then reports the cosine similarity between the two
+embeddings of every text and the encode throughput of both. Exits non-zero
+when any text falls below ``--min-cosine``, so the check can gate a switch
+of backend.
+
+Texts are chunks sampled from an existing store, or a few built-in
+sentences when there is none:
+
+    cd backend
+    python scripts/check_embedding_parity.py --backend onnx
+    python scripts/check_embedding_parity.py --backend onnx --quantization avx2 --store vector_store
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config import settings  # noqa: E402
+from app.services.embedding_backend import EMBEDDING_BACKENDS, load_embedding_model  # noqa: E402
+from app.services.metadata_store import ChunkMetadataStore  # noqa: E402
+
+MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+
+SAMPLE_TEXTS = [
+    "Photosynthesis converts light energy into chemical energy stored in glucose.",
+    "CS-101 covers variables, loops, functions and basic recursion.",
+    "The derivative of sin(x) is cos(x); the integral of 1/x is ln|x| + C.",
+    "Newton's second law states that force equals mass times acceleration.",
+    "Mitochondria are the site of aerobic respiration in eukaryotic cells.",
+    "A binary search tree keeps keys ordered so lookups take O(log n) on average.",
+    "The French Revolution began in 1789 with the storming of the Bastille.",
+    "Supply and demand curves intersect at the market equilibrium price.",
+]
+
+
+def load_texts(store_dir: Path, count: int) -> list:
+    metadata = ChunkMetadataStore(store_dir / "metadata")
+    if not metadata.exists():
+        return SAMPLE_TEXTS
+    metadata.load()
+    if len(metadata) == 0:
+        return SAMPLE_TEXTS
+    rows = np.random.default_rng(0).choice(len(metadata), min(count, len(metadata)), replace=False)
+    return metadata.texts(np.sort(rows))
+
+
+def encode(model, texts: list, batch_size: int):
+    # Warm up so one-off graph initialization is not counted
+    model.encode(texts[:batch_size], batch_size=batch_size)
+    start = time.perf_counter()
+    vectors = np.asarray(model.encode(texts, batch_size=batch_size), dtype='float32')
+    return vectors, len(texts) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backend", choices=EMBEDDING_BACKENDS, default=settings.rag_embedding_backend)
+    parser.add_argument("--quantization", default=settings.rag_onnx_quantization,
+                        help="int8 preset for the ONNX model (empty for float)")
+    parser.add_argument("--threads", type=int, default=settings.rag_embedding_threads)
+    parser.add_argument("--store", type=Path, default=Path("vector_store"),
+                        help="vector store directory to sample chunk texts from")
+    parser.add_argument("--samples", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    args = parser.parse_args()
+
+    settings.rag_embedding_backend = args.backend
+    settings.rag_onnx_quantization = args.quantization
+    settings.rag_embedding_threads = args.threads
+
+    from sentence_transformers import SentenceTransformer
+
+    texts = load_texts(args.store, args.samples)
+    reference = SentenceTransformer(MODEL_NAME)
+    candidate = load_embedding_model(MODEL_NAME, args.store / "models")
+
+    expected, reference_rate = encode(reference, texts, args.batch_size)
+    actual, candidate_rate = encode(candidate, texts, args.batch_size)
+
+    cosine = (expected * actual).sum(axis=1) / (
+        np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1)
+    )
+    label = args.backend + (f" int8 ({args.quantization})" if args.backend == "onnx" and args.quantization else "")
+    print(f"{len(texts)} texts, torch vs {label}")
+    print(f"cosine  min {cosine.min():.5f}  mean {cosine.mean():.5f}")
+    print(f"encode  torch {reference_rate:.1f} texts/s  {label} {candidate_rate:.1f} texts/s "
+          f"({candidate_rate / reference_rate:.2f}x)")
+
+    if cosine.min() < args.min_cosine:
+        worst = int(np.argmin(cosine))
+        print(f"FAIL: cosine {cosine[worst]:.5f} below {args.min_cosine} for: {texts[worst][:80]!r}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
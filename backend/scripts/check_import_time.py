@@ -0,0 +1,94 @@
+"""
+Import-time budget check for the backend.
+
+Imports ``main`` (or ``--module``) in a fresh interpreter with
+``python -X importtime``, parses the per-module timings and fails when
+
+- any of the heavy, feature-specific dependencies is imported eagerly
+  (they must load on first use of their feature), or
+- the total import time exceeds ``--budget-ms``.
+
+The slowest top-level imports are listed either way, so a regression
+points at its cause:
+
+    cd backend
+    python scripts/check_import_time.py
+    python scripts/check_import_time.py --budget-ms 800 --top 20
+"""
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Must not be imported just by loading the app
+DEFERRED_MODULES = (
+    "faiss",
+    "torch",
+    "sentence_transformers",
+    "matplotlib",
+    "reportlab",
+    "pandas",
+    "google.generativeai",
+)
+
+
+def measure(module: str) -> List[Tuple[int, int, int, str]]:
+    """``(self_us, cumulative_us, depth, name)`` for every module the import loads."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        lines = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        sys.exit(f"Importing {module} failed:\n" + "\n".join(lines[-20:]))
+
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # Column header
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((int(fields[0]), int(fields[1]), depth, name.strip()))
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="main", help="module to import (default: main)")
+    parser.add_argument("--budget-ms", type=float, default=1500.0, help="maximum total import time")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest top-level imports to list")
+    args = parser.parse_args()
+
+    entries = measure(args.module)
+    total_ms = sum(self_us for self_us, _, _, _ in entries) / 1000
+    top_level = sorted((entry for entry in entries if entry[2] == 0), key=lambda entry: entry[1], reverse=True)
+
+    print(f"import {args.module}: {total_ms:.0f} ms, {len(entries)} modules (budget {args.budget_ms:.0f} ms)")
+    for _, cumulative_us, _, name in top_level[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    loaded = {name for _, _, _, name in entries}
+    eager = [name for name in DEFERRED_MODULES if name in loaded]
+    failures = []
+    if eager:
+        failures.append(f"imported eagerly: {', '.join(eager)}")
+    if total_ms > args.budget_ms:
+        failures.append(f"{total_ms:.0f} ms exceeds the {args.budget_ms:.0f} ms budget")
+
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()